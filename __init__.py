@@ -1,49 +1,23 @@
-"""The Weatherflow integration."""
-import asyncio
+"""The Weatherflow integration.
 
-import voluptuous as vol
+Home Assistant is only imported by the integration module, loaded on first use
+of its setup functions, so the relay runs on hosts without Home Assistant.
+"""
+from importlib import import_module
 
-from homeassistant.core import HomeAssistant
-from homeassistant.config_entries import ConfigEntry, SOURCE_IMPORT
+from .const import CONF_DEVICES
 
-from .const import DOMAIN
 
-CONFIG_SCHEMA = vol.Schema({DOMAIN: vol.Schema({})}, extra=vol.ALLOW_EXTRA)
+def get_device_option(options, sn, key, default):
+    """Return a per-device option, falling back to the global option."""
+    device = options.get(CONF_DEVICES, {}).get(sn, {})
+    if key in device:
+        return device[key]
+    return options.get(key, default)
 
-PLATFORMS = ["sensor"]
 
-
-async def async_setup(hass: HomeAssistant, config: dict):
-    conf = hass.config_entries.async_entries("weatherflow")
-    if len(conf) == 0:
-        hass.async_create_task(
-                hass.config_entries.flow.async_init(
-                    DOMAIN,
-                    context={"source": SOURCE_IMPORT},
-                    data={},
-                )
-            )
-    return True
-
-
-async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
-    for component in PLATFORMS:
-        hass.async_create_task(
-            hass.config_entries.async_forward_entry_setup(entry, component)
-        )
-
-    return True
-
-
-async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
-    """Unload a config entry."""
-    unload_ok = all(
-        await asyncio.gather(
-            *[
-                hass.config_entries.async_forward_entry_unload(entry, component)
-                for component in PLATFORMS
-            ]
-        )
-    )
-
-    return unload_ok
+def __getattr__(name):
+    """Resolve CONFIG_SCHEMA and the setup functions Home Assistant looks up."""
+    if name.startswith("__"):
+        raise AttributeError(name)
+    return getattr(import_module(__name__ + ".integration"), name)
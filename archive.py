@@ -0,0 +1,146 @@
+"""Append-only binary archive of decoded Weatherflow observations.
+
+Each device and message type has its own file: a 16 byte header followed by
+fixed-width little-endian records of a uint32 timestamp and one float32 per
+remaining schema field, with NaN for missing values. Records are appended in
+timestamp order, so a time range is found by binary search over the
+memory-mapped file.
+"""
+import math
+import mmap
+import os
+import struct
+
+from .schema import SCHEMAS
+
+MAGIC = b"WFAR"
+VERSION = 1
+HEADER = struct.Struct("<4sHH8x")
+
+# Message types archived, rapid_wind is left out as it would dominate the size
+ARCHIVE_STREAMS = ("obs_sky", "obs_air", "obs_st", "evt_strike", "evt_precip")
+
+
+def record_struct(schema):
+    return struct.Struct("<I" + "f" * (len(schema.fields) - 1))
+
+
+class Archive:
+    """Buffers records on the event loop and appends them to disk in the executor."""
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = {}
+        self.structs = {type: record_struct(SCHEMAS[type]) for type in ARCHIVE_STREAMS}
+
+    def filename(self, sn, type):
+        return os.path.join(self.path, "%s_%s.bin" % (sn, type))
+
+    def append(self, sn, schema, values):
+        """Queue one decoded message, values ordered as the schema fields."""
+        record = self.structs.get(schema.type)
+        if record is None:
+            return
+
+        packed = record.pack(
+            int(values[0]), *(math.nan if value is None else value for value in values[1:]))
+        self.pending.setdefault((sn, schema.type), bytearray()).extend(packed)
+
+    def take_pending(self):
+        pending = self.pending
+        self.pending = {}
+        return pending
+
+    def write(self, pending):
+        """Append queued records to their files. Runs in the executor."""
+        os.makedirs(self.path, exist_ok=True)
+        for (sn, type), data in pending.items():
+            filename = self.filename(sn, type)
+            with open(filename, "ab") as archive:
+                if archive.tell() == 0:
+                    archive.write(HEADER.pack(MAGIC, VERSION, len(SCHEMAS[type].fields)))
+                archive.write(data)
+
+    def query(self, sn, type, start=None, end=None, step=None):
+        """Return the records of a device and type between start and end inclusive.
+
+        With step, records are averaged into buckets of step seconds. Runs in
+        the executor.
+        """
+        schema = SCHEMAS[type]
+        record = self.structs[type]
+        result = {"fields": list(schema.fields), "records": []}
+
+        filename = self.filename(sn, type)
+        if not os.path.exists(filename) or os.path.getsize(filename) <= HEADER.size:
+            return result
+
+        with open(filename, "rb") as archive, \
+                mmap.mmap(archive.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            magic, _, fields = HEADER.unpack_from(view)
+            if magic != MAGIC or fields != len(schema.fields):
+                raise ValueError("%s is not an archive of %s" % (filename, type))
+
+            count = (len(view) - HEADER.size) // record.size
+
+            def timestamp(i):
+                return struct.unpack_from("<I", view, HEADER.size + i * record.size)[0]
+
+            first = 0 if start is None else _bisect(timestamp, count, start)
+            last = count if end is None else _bisect(timestamp, count, end + 1)
+
+            rows = (
+                record.unpack_from(view, HEADER.size + i * record.size)
+                for i in range(first, last)
+            )
+            if step:
+                result["records"] = _downsample(rows, step)
+            else:
+                result["records"] = [[row[0]] + [_value(value) for value in row[1:]] for row in rows]
+        return result
+
+
+def _value(value):
+    """Return a stored float32 as the shortest float of the same precision."""
+    return None if math.isnan(value) else float("%.7g" % value)
+
+
+def _bisect(timestamp, count, value):
+    """Index of the first record with a timestamp of at least value."""
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if timestamp(mid) < value:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _downsample(rows, step):
+    """Average rows into buckets of step seconds, ignoring missing values."""
+    records = []
+    bucket = None
+    sums = counts = None
+
+    def close():
+        records.append([bucket] + [
+            round(total / n, 3) if n else None for total, n in zip(sums, counts)
+        ])
+
+    for row in rows:
+        start = row[0] - row[0] % step
+        if start != bucket:
+            if bucket is not None:
+                close()
+            bucket = start
+            sums = [0.0] * (len(row) - 1)
+            counts = [0] * (len(row) - 1)
+        for i, value in enumerate(row[1:]):
+            if not math.isnan(value):
+                sums[i] += value
+                counts[i] += 1
+
+    if bucket is not None:
+        close()
+    return records
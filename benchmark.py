@@ -0,0 +1,248 @@
+"""Capture and replay benchmark for the Weatherflow UDP ingest pipeline.
+
+Record the hub broadcasts heard on this host to a capture file:
+
+    python -m custom_components.weatherflow.benchmark record capture.jsonl
+
+Replay a capture through WFListener and the device controllers against a
+lightweight stand-in for Home Assistant, here at ten times recorded speed:
+
+    python -m custom_components.weatherflow.benchmark replay capture.jsonl --speed 10
+
+A speed of 0 replays as fast as the pipeline accepts frames.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+import tracemalloc
+
+import homeassistant.helpers.device_registry as dr
+from homeassistant.util import slugify
+from homeassistant.util.unit_system import IMPERIAL_SYSTEM, METRIC_SYSTEM
+
+from .capture import encode_record, read_capture
+from .const import UDP_PORT, MAX_DATAGRAM_SIZE
+from .sensor import WFListener
+
+
+def record(path, duration=None, port=UDP_PORT):
+    """Append every datagram received on port to a capture file."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    s.settimeout(1)
+    s.bind(("", port))
+
+    count = 0
+    end = None if duration is None else time.time() + duration
+    with open(path, "a") as capture:
+        try:
+            while end is None or time.time() < end:
+                try:
+                    msg, addr = s.recvfrom(MAX_DATAGRAM_SIZE + 1)
+                except socket.timeout:
+                    continue
+                capture.write(encode_record(time.time(), addr, msg) + "\n")
+                capture.flush()
+                count += 1
+        except KeyboardInterrupt:
+            pass
+        finally:
+            s.close()
+
+    return count
+
+
+class FakeBus:
+    def __init__(self):
+        self.events = 0
+
+    def async_fire(self, event_type, event_data=None, *args, **kwargs):
+        self.events += 1
+
+    def async_listen(self, event_type, listener):
+        return lambda: None
+
+    async_listen_once = async_listen
+
+
+class FakeStates:
+    """Counts state writes and their latency from the receipt of the frame in flight."""
+
+    def __init__(self):
+        self.writes = 0
+        self.latencies = []
+        self.receipt = None
+
+    def async_set(self, entity_id, new_state, attributes=None, force_update=False, context=None):
+        self.writes += 1
+        if self.receipt is not None:
+            self.latencies.append(time.perf_counter() - self.receipt)
+
+
+class FakeConfig:
+    def __init__(self, units):
+        self.units = units
+        self.elevation = 0
+
+    def path(self, *path):
+        return os.path.join(os.getcwd(), *path)
+
+
+class FakeDeviceRegistry:
+    def async_get_or_create(self, **kwargs):
+        return None
+
+
+class FakeConfigEntry:
+    def __init__(self, options):
+        self.entry_id = "benchmark"
+        self.data = {}
+        self.options = options
+
+
+class FakeHass:
+    """The parts of Home Assistant used by the ingest pipeline."""
+
+    def __init__(self, loop, units):
+        self.loop = loop
+        self.data = {dr.DATA_REGISTRY: FakeDeviceRegistry()}
+        self.config = FakeConfig(units)
+        self.bus = FakeBus()
+        self.states = FakeStates()
+        self._pending = set()
+
+    def async_create_task(self, target):
+        task = self.loop.create_task(target)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    def async_add_executor_job(self, target, *args):
+        return self.loop.run_in_executor(None, target, *args)
+
+    async def async_block_till_done(self):
+        # Let callbacks scheduled with call_soon run first, as Home Assistant does
+        await asyncio.sleep(0)
+        while self._pending:
+            await asyncio.wait(list(self._pending))
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def async_replay(frames, speed=1.0, options=None, units=METRIC_SYSTEM, allocations=False):
+    """Replay captured frames through WFListener and return the measurements."""
+    loop = asyncio.get_running_loop()
+    hass = FakeHass(loop, units)
+
+    def async_add_entities(entities, update_before_add=False):
+        for entity in entities:
+            entity.hass = hass
+            entity.entity_id = "sensor." + slugify(entity.unique_id or entity.name)
+            hass.async_create_task(entity.async_added_to_hass())
+
+    listener = WFListener(hass, FakeConfigEntry(options or {}), async_add_entities)
+    states = hass.states
+
+    if allocations:
+        tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    peaks = []
+
+    start = time.perf_counter()
+    first = frames[0][0] if frames else 0
+    for received, msg in frames:
+        if speed:
+            delay = (received - first) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        if allocations:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+
+        states.receipt = time.perf_counter()
+        listener.async_ingest([msg])
+        await hass.async_block_till_done()
+        states.receipt = None
+
+        if allocations:
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+
+    elapsed = time.perf_counter() - start
+    retained = sys.getallocatedblocks() - blocks
+    if allocations:
+        tracemalloc.stop()
+
+    count = len(frames)
+    result = {
+        "frames": count,
+        "seconds": round(elapsed, 3),
+        "packets_per_second": round(count / elapsed, 1) if elapsed else None,
+        "state_writes": states.writes,
+        "bus_events": hass.bus.events,
+        "latency_p50_ms": None,
+        "latency_p99_ms": None,
+        "truncated_frames": listener.stats.truncated_frames,
+        "invalid_frames": listener.stats.invalid_frames,
+        "schema_errors": listener.stats.schema_errors,
+        "failed_frames": listener.stats.failed_frames,
+        "duplicate_frames": listener.stats.duplicate_frames,
+        "stale_frames": listener.stats.stale_frames,
+        "dropped_frames": listener.stats.dropped_frames,
+        "retained_blocks_per_packet": round(retained / count, 2) if count else None,
+    }
+    if states.latencies:
+        result["latency_p50_ms"] = round(percentile(states.latencies, 0.5) * 1000, 3)
+        result["latency_p99_ms"] = round(percentile(states.latencies, 0.99) * 1000, 3)
+    if peaks:
+        result["peak_bytes_per_packet"] = round(sum(peaks) / len(peaks), 1)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    rec = commands.add_parser("record", help="record UDP broadcasts to a capture file")
+    rec.add_argument("capture")
+    rec.add_argument("--duration", type=float, help="seconds to record, default until interrupted")
+    rec.add_argument("--port", type=int, default=UDP_PORT)
+
+    rep = commands.add_parser("replay", help="replay a capture file through the listener")
+    rep.add_argument("capture")
+    rep.add_argument("--speed", type=float, default=1.0, help="multiple of recorded speed, 0 for unpaced")
+    rep.add_argument("--options", type=json.loads, default={}, help="config entry options as JSON")
+    rep.add_argument("--imperial", action="store_true", help="use the imperial unit system")
+    rep.add_argument("--allocations", action="store_true", help="trace allocations per packet")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        count = record(args.capture, args.duration, args.port)
+        print("Recorded %d datagrams to %s" % (count, args.capture))
+        return
+
+    result = asyncio.run(async_replay(
+        read_capture(args.capture),
+        speed=args.speed,
+        options=args.options,
+        units=IMPERIAL_SYSTEM if args.imperial else METRIC_SYSTEM,
+        allocations=args.allocations,
+    ))
+    for key, value in result.items():
+        print("%-28s %s" % (key, value))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""Capture files of raw Weatherflow datagrams, one JSON record per line."""
+import json
+
+
+def encode_record(received, addr, msg):
+    """Return one capture file line for a datagram."""
+    return json.dumps({
+        "time": received,
+        "addr": addr[0] if addr else None,
+        "data": msg.decode("utf-8", "surrogateescape"),
+    })
+
+
+def decode_record(line):
+    """Return the receive time and raw datagram of a capture file line."""
+    record = json.loads(line)
+    return record["time"], record["data"].encode("utf-8", "surrogateescape")
+
+
+def read_capture(path):
+    with open(path) as capture:
+        return [decode_record(line) for line in capture if line.strip()]
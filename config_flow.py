@@ -3,7 +3,42 @@ import logging
 from homeassistant.helpers import config_entry_flow
 from homeassistant import config_entries
 from homeassistant.core import callback
-from .const import DOMAIN
+from . import get_device_option
+from .const import (
+    DOMAIN,
+    DATA_LISTENER,
+    CONF_DEVICE,
+    CONF_DEVICES,
+    CONF_RECEIVE_BUFFER,
+    DEFAULT_RECEIVE_BUFFER,
+    CONF_QUEUE_SIZE,
+    DEFAULT_QUEUE_SIZE,
+    CONF_DROP_POLICY,
+    DEFAULT_DROP_POLICY,
+    DROP_POLICIES,
+    CONF_RAPID_WIND_INTERVAL,
+    DEFAULT_RAPID_WIND_INTERVAL,
+    CONF_ALWAYS_UPDATE,
+    DEFAULT_ALWAYS_UPDATE,
+    CONF_HISTORY_SENSORS,
+    DEFAULT_HISTORY_SENSORS,
+    CONF_ARCHIVE,
+    DEFAULT_ARCHIVE,
+    CONF_LIGHTNING_WINDOW,
+    DEFAULT_LIGHTNING_WINDOW,
+    CONF_STRIKE_EVENTS,
+    DEFAULT_STRIKE_EVENTS,
+    CONF_STORM_RADIUS,
+    DEFAULT_STORM_RADIUS,
+    CONF_WIND_AVERAGES,
+    DEFAULT_WIND_AVERAGES,
+    CONF_WIND_AVERAGE_INTERVAL,
+    DEFAULT_WIND_AVERAGE_INTERVAL,
+    CONF_ELEVATION,
+    CONF_HEARTBEAT,
+    DEFAULT_HEARTBEAT,
+    DEFAULT_DEADBANDS,
+)
 from homeassistant import data_entry_flow
 from collections import OrderedDict
 from typing import Optional
@@ -36,4 +71,132 @@ class WeatherflowConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     @callback
     def async_get_options_flow(config_entry):
         """Get the options flow for this handler."""
-        return None
\ No newline at end of file
+        return WeatherflowOptionsFlow(config_entry)
+
+
+class WeatherflowOptionsFlow(config_entries.OptionsFlow):
+
+    def __init__(self, config_entry):
+        self.config_entry = config_entry
+        self.options = dict(config_entry.options)
+        self.device = None
+
+    def _known_devices(self):
+        devices = set(self.options.get(CONF_DEVICES, {}))
+        data = self.hass.data.get(DOMAIN, {}).get(self.config_entry.entry_id, {})
+        listener = data.get(DATA_LISTENER)
+        if listener is not None:
+            devices.update(listener.devices())
+        return sorted(devices)
+
+    async def async_step_init(self, user_input=None):
+        if user_input is not None:
+            device = user_input.pop(CONF_DEVICE, "")
+            self.options.update(user_input)
+            if device:
+                self.device = device
+                return await self.async_step_device()
+            return self.async_create_entry(title="", data=self.options)
+
+        options = self.options
+
+        data_schema = OrderedDict()
+        data_schema[vol.Optional(
+            CONF_RECEIVE_BUFFER,
+            default=options.get(CONF_RECEIVE_BUFFER, DEFAULT_RECEIVE_BUFFER),
+        )] = vol.All(vol.Coerce(int), vol.Range(min=0))
+        data_schema[vol.Optional(
+            CONF_QUEUE_SIZE,
+            default=options.get(CONF_QUEUE_SIZE, DEFAULT_QUEUE_SIZE),
+        )] = vol.All(vol.Coerce(int), vol.Range(min=1))
+        data_schema[vol.Optional(
+            CONF_DROP_POLICY,
+            default=options.get(CONF_DROP_POLICY, DEFAULT_DROP_POLICY),
+        )] = vol.In(DROP_POLICIES)
+        data_schema[vol.Optional(
+            CONF_RAPID_WIND_INTERVAL,
+            default=options.get(CONF_RAPID_WIND_INTERVAL, DEFAULT_RAPID_WIND_INTERVAL),
+        )] = vol.All(vol.Coerce(int), vol.Range(min=0))
+        data_schema[vol.Optional(
+            CONF_ALWAYS_UPDATE,
+            default=options.get(CONF_ALWAYS_UPDATE, DEFAULT_ALWAYS_UPDATE),
+        )] = bool
+        data_schema[vol.Optional(
+            CONF_HISTORY_SENSORS,
+            default=options.get(CONF_HISTORY_SENSORS, DEFAULT_HISTORY_SENSORS),
+        )] = bool
+        data_schema[vol.Optional(
+            CONF_ARCHIVE,
+            default=options.get(CONF_ARCHIVE, DEFAULT_ARCHIVE),
+        )] = bool
+        data_schema[vol.Optional(
+            CONF_LIGHTNING_WINDOW,
+            default=options.get(CONF_LIGHTNING_WINDOW, DEFAULT_LIGHTNING_WINDOW),
+        )] = vol.All(vol.Coerce(int), vol.Range(min=0))
+        data_schema[vol.Optional(
+            CONF_STRIKE_EVENTS,
+            default=options.get(CONF_STRIKE_EVENTS, DEFAULT_STRIKE_EVENTS),
+        )] = bool
+        data_schema[vol.Optional(
+            CONF_STORM_RADIUS,
+            default=options.get(CONF_STORM_RADIUS, DEFAULT_STORM_RADIUS),
+        )] = vol.All(vol.Coerce(float), vol.Range(min=0))
+        data_schema[vol.Optional(
+            CONF_WIND_AVERAGES,
+            default=options.get(CONF_WIND_AVERAGES, DEFAULT_WIND_AVERAGES),
+        )] = vol.Match(r"^\s*(0*[1-9]\d*\s*(,\s*0*[1-9]\d*\s*)*)?$")
+        data_schema[vol.Optional(
+            CONF_WIND_AVERAGE_INTERVAL,
+            default=options.get(CONF_WIND_AVERAGE_INTERVAL, DEFAULT_WIND_AVERAGE_INTERVAL),
+        )] = vol.All(vol.Coerce(int), vol.Range(min=0))
+        for key, default in DEFAULT_DEADBANDS.items():
+            data_schema[vol.Optional(key, default=options.get(key, default))] = vol.All(
+                vol.Coerce(float), vol.Range(min=0))
+        data_schema[vol.Optional(
+            CONF_HEARTBEAT,
+            default=options.get(CONF_HEARTBEAT, DEFAULT_HEARTBEAT),
+        )] = vol.All(vol.Coerce(int), vol.Range(min=0))
+        data_schema[vol.Optional(CONF_DEVICE, default="")] = vol.In([""] + self._known_devices())
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(data_schema)
+        )
+
+    async def async_step_device(self, user_input=None):
+        """Per-device overrides of the global options."""
+        if user_input is not None:
+            devices = dict(self.options.get(CONF_DEVICES, {}))
+            devices[self.device] = user_input
+            self.options[CONF_DEVICES] = devices
+            return self.async_create_entry(title="", data=self.options)
+
+        options = self.options
+
+        data_schema = OrderedDict()
+        data_schema[vol.Optional(
+            CONF_RAPID_WIND_INTERVAL,
+            default=get_device_option(
+                options, self.device, CONF_RAPID_WIND_INTERVAL, DEFAULT_RAPID_WIND_INTERVAL),
+        )] = vol.All(vol.Coerce(int), vol.Range(min=0))
+        data_schema[vol.Optional(
+            CONF_ALWAYS_UPDATE,
+            default=get_device_option(
+                options, self.device, CONF_ALWAYS_UPDATE, DEFAULT_ALWAYS_UPDATE),
+        )] = bool
+        data_schema[vol.Optional(
+            CONF_HISTORY_SENSORS,
+            default=get_device_option(
+                options, self.device, CONF_HISTORY_SENSORS, DEFAULT_HISTORY_SENSORS),
+        )] = bool
+        data_schema[vol.Optional(
+            CONF_ELEVATION,
+            default=get_device_option(
+                options, self.device, CONF_ELEVATION, self.hass.config.elevation),
+        )] = vol.Coerce(float)
+
+        return self.async_show_form(
+            step_id="device",
+            data_schema=vol.Schema(data_schema),
+            description_placeholders={"device": self.device},
+        )
@@ -1,3 +1,118 @@
 """Constants for the Weatherflow integration."""
 
 DOMAIN = "weatherflow"
+
+DATA_LISTENER = "listener"
+DATA_UNDO_UPDATE_LISTENER = "undo_update_listener"
+
+UDP_PORT = 50222
+
+SERVICE_DUMP_DIAGNOSTICS = "dump_diagnostics"
+DIAGNOSTICS_FILE = "weatherflow_diagnostics.json"
+
+# Discovered devices and their last observations, per config entry
+STORAGE_KEY = DOMAIN + ".{}"
+STORAGE_VERSION = 1
+
+SERVICE_EXPORT_ARCHIVE = "export_archive"
+ARCHIVE_DIR = "weatherflow_archive"
+ARCHIVE_EXPORT_FILE = "weatherflow_archive_{}_{}.json"
+
+CONF_RECEIVE_BUFFER = "receive_buffer"
+CONF_DEVICE = "device"
+CONF_DEVICES = "devices"
+CONF_RAPID_WIND_INTERVAL = "rapid_wind_interval"
+CONF_ALWAYS_UPDATE = "always_update"
+CONF_HISTORY_SENSORS = "history_sensors"
+CONF_ELEVATION = "elevation"
+CONF_HEARTBEAT = "heartbeat"
+CONF_QUEUE_SIZE = "queue_size"
+CONF_DROP_POLICY = "drop_policy"
+CONF_ARCHIVE = "archive"
+CONF_LIGHTNING_WINDOW = "lightning_window"
+CONF_STRIKE_EVENTS = "strike_events"
+CONF_STORM_RADIUS = "storm_radius"
+CONF_WIND_AVERAGES = "wind_averages"
+CONF_WIND_AVERAGE_INTERVAL = "wind_average_interval"
+CONF_DEADBAND_BATTERY = "deadband_battery"
+CONF_DEADBAND_HUMIDITY = "deadband_humidity"
+CONF_DEADBAND_ILLUMINANCE = "deadband_illuminance"
+CONF_DEADBAND_PRESSURE = "deadband_pressure"
+CONF_DEADBAND_SOLAR_RADIATION = "deadband_solar_radiation"
+CONF_DEADBAND_TEMPERATURE = "deadband_temperature"
+CONF_DEADBAND_WIND = "deadband_wind"
+
+# Requested SO_RCVBUF in bytes, 0 keeps the operating system default
+DEFAULT_RECEIVE_BUFFER = 262144
+
+# Minimum seconds between rapid wind state writes, 0 writes every sample
+DEFAULT_RAPID_WIND_INTERVAL = 0
+
+# Write every entity of a stream on each observation, not only those whose value changed
+DEFAULT_ALWAYS_UPDATE = False
+
+# Add sensors computed over the in-memory observation history
+DEFAULT_HISTORY_SENSORS = False
+
+# Append observations and events to the binary archive in ARCHIVE_DIR
+DEFAULT_ARCHIVE = False
+
+# Seconds of lightning strikes summarised per lightning_strikes event, 0 disables
+DEFAULT_LIGHTNING_WINDOW = 300
+
+# Fire a lightning_strike event for every strike
+DEFAULT_STRIKE_EVENTS = False
+
+# Distance in km whose crossing by the fitted storm track fires lightning_storm_radius
+DEFAULT_STORM_RADIUS = 10
+
+# Comma separated windows in minutes of the vector averaged rapid wind, empty disables
+DEFAULT_WIND_AVERAGES = "2,10"
+
+# Minimum seconds between writes of the vector averaged wind
+DEFAULT_WIND_AVERAGE_INTERVAL = 60
+
+# Longest a sensor may go without a state write while inside its deadband, 0 disables
+DEFAULT_HEARTBEAT = 0
+
+# Smallest change written per sensor type, in metric units or percent for
+# illuminance and solar radiation; 0 writes every change
+DEFAULT_DEADBANDS = {
+    CONF_DEADBAND_BATTERY: 0,
+    CONF_DEADBAND_HUMIDITY: 0,
+    CONF_DEADBAND_ILLUMINANCE: 0,
+    CONF_DEADBAND_PRESSURE: 0,
+    CONF_DEADBAND_SOLAR_RADIATION: 0,
+    CONF_DEADBAND_TEMPERATURE: 0,
+    CONF_DEADBAND_WIND: 0,
+}
+
+# Largest datagram accepted, anything bigger is counted as truncated and dropped
+MAX_DATAGRAM_SIZE = 8192
+
+# Upper bound on datagrams drained from the socket per wakeup
+MAX_BATCH_SIZE = 256
+
+# Queued messages dispatched per event loop iteration. Smaller than
+# MAX_BATCH_SIZE, so under a flood reads get ahead of dispatch and the queue,
+# not the kernel receive buffer, absorbs the overload
+DRAIN_BATCH_SIZE = 64
+
+# Linux socket option reporting datagrams dropped by the kernel when the
+# receive buffer is full, missing from the socket module. Elsewhere those
+# losses are not counted.
+SO_RXQ_OVFL = 40
+
+# Recent (serial number, type, timestamp) keys remembered to discard frames
+# heard through more than one hub or rebroadcast
+DUPLICATE_CACHE_SIZE = 512
+
+# Decoded messages waiting to be dispatched
+DEFAULT_QUEUE_SIZE = 1024
+
+# When the queue is full, drop the oldest droppable message (rapid_wind and
+# status reports) before any observation or event, or drop the incoming message
+DROP_POLICY_LOW_PRIORITY = "low_priority"
+DROP_POLICY_NEWEST = "newest"
+DROP_POLICIES = [DROP_POLICY_LOW_PRIORITY, DROP_POLICY_NEWEST]
+DEFAULT_DROP_POLICY = DROP_POLICY_LOW_PRIORITY
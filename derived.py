@@ -0,0 +1,88 @@
+"""Meteorological quantities derived from Weatherflow observations.
+
+Inputs and results are metric: temperatures in °C, relative humidity in %,
+wind speed in m/s, pressure in mbar and elevation in metres.
+"""
+from math import log
+
+# Store fields filled by derive(), in the order of its result
+DERIVED_FIELDS = ("dew_point", "heat_index", "wind_chill", "feels_like", "sea_level_pressure")
+
+
+def dew_point(temp, humidity):
+    """Magnus approximation of the dew point."""
+    if temp is None or not humidity:
+        return None
+    gamma = log(humidity / 100) + 17.625 * temp / (243.04 + temp)
+    return 243.04 * gamma / (17.625 - gamma)
+
+
+def heat_index(temp, humidity):
+    """NWS heat index, or the air temperature below 80 °F where it does not apply."""
+    if temp is None or humidity is None:
+        return None
+
+    t = temp * 9 / 5 + 32
+    if t < 80:
+        return temp
+
+    hi = 0.5 * (t + 61 + (t - 68) * 1.2 + humidity * 0.094)
+    if (hi + t) / 2 >= 80:
+        hi = (-42.379 + 2.04901523 * t + 10.14333127 * humidity
+              - 0.22475541 * t * humidity - 0.00683783 * t * t
+              - 0.05481717 * humidity * humidity + 0.00122874 * t * t * humidity
+              + 0.00085282 * t * humidity * humidity
+              - 0.00000199 * t * t * humidity * humidity)
+        if humidity < 13 and 80 <= t <= 112:
+            hi -= (13 - humidity) / 4 * ((17 - abs(t - 95)) / 17) ** 0.5
+        elif humidity > 85 and 80 <= t <= 87:
+            hi += (humidity - 85) / 10 * (87 - t) / 5
+
+    return (hi - 32) * 5 / 9
+
+
+def wind_chill(temp, wind):
+    """Environment Canada wind chill, or the air temperature where it does not apply."""
+    if temp is None:
+        return None
+    if wind is None:
+        return temp
+
+    kmh = wind * 3.6
+    if temp > 10 or kmh <= 4.8:
+        return temp
+    v = kmh ** 0.16
+    return 13.12 + 0.6215 * temp - 11.37 * v + 0.3965 * temp * v
+
+
+def feels_like(temp, humidity, wind):
+    if temp is None:
+        return None
+    if temp <= 10:
+        return wind_chill(temp, wind)
+    if temp >= 26.7:
+        return heat_index(temp, humidity)
+    return temp
+
+
+def sea_level_pressure(pressure, temp, elevation):
+    """Reduce station pressure to sea level with the hypsometric formula."""
+    if pressure is None or temp is None or elevation is None:
+        return None
+    lapse = 0.0065 * elevation
+    return pressure * (1 - lapse / (temp + lapse + 273.15)) ** -5.257
+
+
+def _round(value, digits):
+    return None if value is None else round(value, digits)
+
+
+def derive(temp, humidity, pressure, wind, elevation):
+    """Return the values of DERIVED_FIELDS for one observation."""
+    return (
+        _round(dew_point(temp, humidity), 1),
+        _round(heat_index(temp, humidity), 1),
+        _round(wind_chill(temp, wind), 1),
+        _round(feels_like(temp, humidity, wind), 1),
+        _round(sea_level_pressure(pressure, temp, elevation), 2),
+    )
@@ -0,0 +1,283 @@
+"""Descriptions of every Weatherflow sensor, shared by all device kinds."""
+from collections import namedtuple
+from functools import lru_cache
+
+from homeassistant.const import (
+    ILLUMINANCE,
+    DEVICE_CLASS_ILLUMINANCE,
+    UNIT_UV_INDEX,
+    PRESSURE_MBAR,
+    PRESSURE_INHG,
+    DEVICE_CLASS_PRESSURE,
+    TEMP_CELSIUS,
+    TEMP_FAHRENHEIT,
+    DEVICE_CLASS_TEMPERATURE,
+    DEVICE_CLASS_HUMIDITY,
+    DEVICE_CLASS_SIGNAL_STRENGTH,
+)
+
+from .const import (
+    CONF_DEADBAND_BATTERY,
+    CONF_DEADBAND_HUMIDITY,
+    CONF_DEADBAND_ILLUMINANCE,
+    CONF_DEADBAND_PRESSURE,
+    CONF_DEADBAND_SOLAR_RADIATION,
+    CONF_DEADBAND_TEMPERATURE,
+    CONF_DEADBAND_WIND,
+)
+
+SensorDescription = namedtuple(
+    "SensorDescription",
+    ["key", "name", "field", "units", "device_class", "icon", "value", "state",
+     "attributes", "fields", "deadband", "deadband_relative"],
+)
+
+# Unit conversions as (metric unit, imperial unit, imperial factor, imperial rounding)
+UNITS_WIND = ("m/s", "mph", 2.23694, 2)
+UNITS_RAIN = ("mm", "in", 1 / 25.4, 3)
+UNITS_PRESSURE = (PRESSURE_MBAR, PRESSURE_INHG, 1 / 33.863753, 3)
+UNITS_DISTANCE = ("km", "mi", 1 / 1.609, 3)
+UNITS_STORM_SPEED = ("km/h", "mph", 1 / 1.609, 1)
+UNITS_TEMPERATURE_DELTA = (TEMP_CELSIUS, TEMP_FAHRENHEIT, 1.8, 2)
+UNITS_ILLUMINANCE = (ILLUMINANCE, ILLUMINANCE, None, None)
+
+# Statistics of the rapid_wind samples between two state writes
+WINDOW_FIELDS = ('window_min', 'window_max', 'window_mean', 'window_samples')
+
+
+def _fixed(unit):
+    """Units of a value shown the same in both unit systems."""
+    return (unit, unit, None, None)
+
+
+def _describe(key, name, field=None, units=None, device_class=None, icon=None, value=None,
+              state=None, attributes=None, fields=(), deadband=None, deadband_relative=False):
+    """Describe a sensor.
+
+    field is the store field read, the key by default. icon is an icon or a
+    function of the value returning one, value a function of the store data
+    replacing the field, state a function of the value returning a label
+    shown instead of the converted value, and attributes a function of
+    (value, data, convert, store attributes) returning the entity attributes.
+    fields are further store fields whose changes require a state write.
+    """
+    return SensorDescription(
+        key, name, key if field is None else field, units, device_class, icon, value, state,
+        attributes, ((key if field is None else field),) + fields, deadband, deadband_relative)
+
+
+def _window_attributes(value, data, convert, attributes):
+    if not data.get("window_samples"):
+        return attributes
+    attributes = dict(attributes)
+    attributes["Window Min"] = convert(data["window_min"])
+    attributes["Window Max"] = convert(data["window_max"])
+    attributes["Window Mean"] = convert(round(data["window_mean"], 2))
+    attributes["Window Samples"] = data["window_samples"]
+    return attributes
+
+
+COMPASS = ("N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE", "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW")
+
+
+def _compass(value):
+    if value is None:
+        return None
+    return COMPASS[int((value / 22.5) + .5) % 16]
+
+
+def _direction_attributes(value, data, convert, attributes):
+    attributes = dict(attributes)
+    attributes['Direction'] = value
+    return attributes
+
+
+def _rain_rate(data):
+    if data['rain_accum'] is None or data['report_interval'] is None:
+        return None
+    return data['rain_accum'] / data['report_interval'] * 60
+
+
+def _rain_intensity(rain_rate):
+    if rain_rate is None:
+        return None
+    if rain_rate == 0:
+        return "None"
+    if rain_rate < 0.25:
+        return "Very Light"
+    if rain_rate < 1.0:
+        return "Light"
+    if rain_rate < 4.0:
+        return "Moderate"
+    if rain_rate < 16.0:
+        return "Heavy"
+    if rain_rate < 50.0:
+        return "Very Heavy"
+    return "Extreme"
+
+
+def _rain_rate_icon(rain_rate):
+    if rain_rate is None or rain_rate == 0:
+        return "mdi:water-off"
+    if rain_rate >= 4:
+        return "mdi:weather-pouring"
+    return "mdi:weather-rainy"
+
+
+def _rain_rate_attributes(value, data, convert, attributes):
+    attributes = dict(attributes)
+    if value is not None:
+        attributes['Rain Rate'] = convert(value)
+    return attributes
+
+
+def _precip_type(value):
+    if value is None:
+        return None
+    if value == 1:
+        return 'Rain'
+    if value == 2:
+        return 'Hail'
+    return 'None'
+
+
+def _precip_type_icon(value):
+    if value == 1:
+        return 'mdi:weather-rainy'
+    if value == 2:
+        return 'mdi:weather-hail'
+    return 'mdi:water-off'
+
+
+def _wind(key, name, fields=(), attributes=None):
+    return _describe(key, name, units=UNITS_WIND, icon='mdi:weather-windy',
+                     attributes=attributes, fields=fields, deadband=CONF_DEADBAND_WIND)
+
+
+def _direction(key, name):
+    return _describe(key, name, icon='mdi:compass', state=_compass, attributes=_direction_attributes)
+
+
+def _temperature(key, name):
+    return _describe(key, name, units=_fixed(TEMP_CELSIUS), device_class=DEVICE_CLASS_TEMPERATURE,
+                     deadband=CONF_DEADBAND_TEMPERATURE)
+
+
+def _pressure(key, name):
+    return _describe(key, name, units=UNITS_PRESSURE, device_class=DEVICE_CLASS_PRESSURE,
+                     deadband=CONF_DEADBAND_PRESSURE)
+
+
+def _distance(key, name):
+    return _describe(key, name, units=UNITS_DISTANCE, icon="mdi:flash")
+
+
+def _rain(key, name):
+    return _describe(key, name, units=UNITS_RAIN, icon='mdi:water')
+
+
+# Sensors of each group of store fields, as listed by the devices
+RAPID_WIND_SENSORS = (
+    _wind("rapid_speed", "Wind Current Speed", fields=WINDOW_FIELDS, attributes=_window_attributes),
+    _direction("rapid_direction", "Wind Current Direction"),
+)
+
+SKY_SENSORS = (
+    _describe("illuminance", "Illuminance", units=_fixed(ILLUMINANCE),
+              device_class=DEVICE_CLASS_ILLUMINANCE,
+              deadband=CONF_DEADBAND_ILLUMINANCE, deadband_relative=True),
+    _describe("uv", "UV Index", units=_fixed(UNIT_UV_INDEX), icon='mdi:weather-sunny'),
+    _rain("rain_accum", "Accumulated Rain"),
+    _describe("", "Rain Rate", field="rain_accum", units=UNITS_RAIN, icon=_rain_rate_icon,
+              value=_rain_rate, state=_rain_intensity, attributes=_rain_rate_attributes,
+              fields=("report_interval",)),
+    _wind("wind_lull", "Wind Lull"),
+    _wind("wind_avg", "Wind Average"),
+    _wind("wind_gust", "Wind Gust"),
+    _direction("wind_direction", "Wind Direction"),
+    _describe("solar_radiation", "Solar Radiation", units=_fixed("w/m2"), icon='mdi:weather-sunny',
+              deadband=CONF_DEADBAND_SOLAR_RADIATION, deadband_relative=True),
+    _describe("precip_type", "Precipitation Type", icon=_precip_type_icon, state=_precip_type),
+)
+
+AIR_SENSORS = (
+    _pressure("pressure", "Station Pressure"),
+    _temperature("temp", "Temperature"),
+    _describe("humidity", "Relative Humidity", units=_fixed('%'), device_class=DEVICE_CLASS_HUMIDITY,
+              deadband=CONF_DEADBAND_HUMIDITY),
+    _describe("lightning_count", "Lightning Strike Count", icon="mdi:flash"),
+    _distance("lightning_avg_dist", "Lightning Average Distance"),
+)
+
+BATTERY_SENSORS = (
+    _describe("battery", "Battery Voltage", units=_fixed('V'), icon='mdi:battery',
+              deadband=CONF_DEADBAND_BATTERY),
+)
+
+STRIKE_SENSORS = (
+    _distance("distance", "Lightning Strike"),
+)
+
+STATUS_SENSORS = (
+    _describe("rssi", "RSSI", device_class=DEVICE_CLASS_SIGNAL_STRENGTH),
+)
+
+DERIVED_SENSORS = (
+    _temperature("dew_point", "Dew Point"),
+    _temperature("heat_index", "Heat Index"),
+    _temperature("wind_chill", "Wind Chill"),
+    _temperature("feels_like", "Feels Like"),
+    _pressure("sea_level_pressure", "Sea Level Pressure"),
+)
+
+STORM_SENSORS = (
+    _distance("storm_distance", "Storm Distance"),
+    _describe("storm_speed", "Storm Approach Speed", units=UNITS_STORM_SPEED, icon="mdi:weather-lightning"),
+    _describe("storm_eta", "Storm Arrival", units=_fixed("min"), icon="mdi:timer-outline"),
+    _describe("storm_rate", "Storm Activity", units=_fixed("strikes/min"), icon="mdi:weather-lightning"),
+)
+
+STRIKE_SUMMARY_SENSORS = (
+    _describe("strike_count", "Lightning Strikes", icon="mdi:flash"),
+    _distance("strike_nearest", "Lightning Nearest Strike"),
+    _distance("strike_mean_distance", "Lightning Mean Strike Distance"),
+    _describe("strike_energy", "Lightning Strike Energy", icon="mdi:flash"),
+)
+
+RAIN_TOTAL_SENSORS = (
+    _rain("rain_last_hour", "Rain Last Hour"),
+    _rain("rain_today", "Rain Today"),
+    _rain("rain_yesterday", "Rain Yesterday"),
+    _rain("rain_event", "Rain Event"),
+)
+
+
+@lru_cache(maxsize=None)
+def wind_average_sensors(minutes):
+    """Sensors of the vector averaged wind over a window of minutes."""
+    speed = "wind_speed_%dm" % minutes
+    direction = "wind_direction_%dm" % minutes
+    return (
+        _wind(speed, "Wind Speed %d min" % minutes),
+        _direction(direction, "Wind Direction %d min" % minutes),
+    )
+
+
+# Optional statistics over the observation history of each stream, as
+# (description, column, window seconds, statistic). Their state is written
+# on every observation of the stream.
+def _rolling(key, name, column, seconds, statistic, units, icon):
+    return (_describe(key, name, field="timestamp", units=units, icon=icon), column, seconds, statistic)
+
+
+ROLLING_STATISTICS = {
+    "obs_sky": (
+        _rolling("wind_gust_max_10m", "Wind Gust Max 10 min", "wind_gust", 600, "max", UNITS_WIND, "mdi:weather-windy"),
+        _rolling("illuminance_max_1h", "Illuminance Peak 1 h", "illuminance", 3600, "max", UNITS_ILLUMINANCE, "mdi:white-balance-sunny"),
+    ),
+    "obs_air": (
+        _rolling("temp_delta_1h", "Temperature Change 1 h", "temp", 3600, "delta", UNITS_TEMPERATURE_DELTA, "mdi:thermometer"),
+        _rolling("pressure_trend_3h", "Pressure Trend 3 h", "pressure", 10800, "delta", UNITS_PRESSURE, "mdi:gauge"),
+    ),
+}
+ROLLING_STATISTICS["obs_st"] = ROLLING_STATISTICS["obs_sky"] + ROLLING_STATISTICS["obs_air"]
@@ -0,0 +1,74 @@
+"""Ingest counters and latency histogram of the Weatherflow listener."""
+from collections import Counter, deque
+
+# Upper bounds in milliseconds of the latency histogram buckets
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Latency samples kept for the rolling histogram
+LATENCY_SAMPLES = 1000
+
+
+class IngestStats:
+    """Counters of every frame seen by a listener."""
+
+    def __init__(self):
+        self.received_frames = 0
+        self.truncated_frames = 0
+        self.invalid_frames = 0
+        self.schema_errors = 0
+        self.failed_frames = 0
+        self.duplicate_frames = 0
+        self.stale_frames = 0
+        self.dropped_frames = 0
+        # Datagrams dropped by the kernel before they were read, Linux only,
+        # updated with the next datagram read after a loss
+        self.kernel_dropped_frames = 0
+
+        self.received_types = Counter()
+        self.hub_received = Counter()
+        self.hub_dropped = Counter()
+
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def record_latency(self, seconds):
+        self.latencies.append(seconds * 1000)
+
+    def histogram(self):
+        """Count the recent latencies falling in each bucket."""
+        counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        for latency in self.latencies:
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+
+        labels = ["<=%sms" % bound for bound in LATENCY_BUCKETS] + [">%sms" % LATENCY_BUCKETS[-1]]
+        return dict(zip(labels, counts))
+
+    def percentile(self, fraction):
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))], 3)
+
+    def as_dict(self, queue_depth=0):
+        return {
+            "received_frames": self.received_frames,
+            "truncated_frames": self.truncated_frames,
+            "json_errors": self.invalid_frames,
+            "schema_errors": self.schema_errors,
+            "failed_frames": self.failed_frames,
+            "duplicate_frames": self.duplicate_frames,
+            "stale_frames": self.stale_frames,
+            "dropped_frames": self.dropped_frames,
+            "kernel_dropped_frames": self.kernel_dropped_frames,
+            "queue_depth": queue_depth,
+            "received_types": dict(self.received_types),
+            "hub_received": dict(self.hub_received),
+            "hub_dropped": dict(self.hub_dropped),
+            "latency_p50_ms": self.percentile(0.5),
+            "latency_p99_ms": self.percentile(0.99),
+            "latency_histogram": self.histogram(),
+        }
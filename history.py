@@ -0,0 +1,88 @@
+"""Fixed-size in-memory history of recent Weatherflow observations."""
+from array import array
+from bisect import bisect_left
+from math import isnan, nan
+
+# Columns kept for each message stream
+HISTORY_COLUMNS = {
+    "obs_sky": ("illuminance", "uv", "rain_accum", "wind_lull", "wind_avg", "wind_gust", "solar_radiation"),
+    "obs_air": ("pressure", "temp", "humidity", "lightning_count"),
+    "obs_st": (
+        "wind_lull", "wind_avg", "wind_gust", "pressure", "temp", "humidity",
+        "illuminance", "uv", "solar_radiation", "rain_accum", "lightning_count",
+    ),
+}
+
+# Samples kept per stream, a little over four hours of one minute observations
+HISTORY_SIZE = 256
+
+
+class RingBuffer:
+    """Columns of the most recent samples of one stream, oldest overwritten first.
+
+    Every column is an array of doubles of the same fixed size, with missing
+    values stored as NaN. Samples are expected in timestamp order.
+    """
+
+    def __init__(self, columns, size=HISTORY_SIZE):
+        self.size = size
+        self.times = array("d", bytes(8 * size))
+        self.columns = {column: array("d", [nan]) * size for column in columns}
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        """Return the timestamp of the i-th oldest sample."""
+        return self.times[(self.start + i) % self.size]
+
+    def append(self, timestamp, data):
+        """Add a sample, reading each column from the data mapping."""
+        if self.count < self.size:
+            index = (self.start + self.count) % self.size
+            self.count += 1
+        else:
+            index = self.start
+            self.start = (self.start + 1) % self.size
+
+        self.times[index] = timestamp
+        for column, values in self.columns.items():
+            value = data.get(column)
+            values[index] = nan if value is None else value
+
+    def window(self, column, seconds):
+        """Return the values of a column from the last seconds of samples, oldest first."""
+        if not self.count:
+            return []
+
+        newest = self[self.count - 1]
+        first = bisect_left(self, newest - seconds, 0, self.count)
+        values = self.columns[column]
+
+        begin = (self.start + first) % self.size
+        end = (self.start + self.count) % self.size
+        if begin < end:
+            segment = values[begin:end]
+        else:
+            segment = values[begin:] + values[:end]
+        return [value for value in segment if not isnan(value)]
+
+    def statistic(self, column, seconds, statistic):
+        """Compute max, min, mean or delta (newest minus oldest) over a window."""
+        values = self.window(column, seconds)
+        if not values:
+            return None
+
+        if statistic == "max":
+            return max(values)
+        if statistic == "min":
+            return min(values)
+        if statistic == "mean":
+            return sum(values) / len(values)
+        if statistic == "delta":
+            if len(values) < 2:
+                return None
+            return values[-1] - values[0]
+        raise ValueError("Unknown statistic %s" % statistic)
@@ -0,0 +1,143 @@
+"""Setup of the Weatherflow integration in Home Assistant."""
+import asyncio
+import logging
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant
+from homeassistant.config_entries import ConfigEntry, SOURCE_IMPORT
+import homeassistant.helpers.config_validation as cv
+import homeassistant.util.dt as dt_util
+from homeassistant.util.json import save_json
+
+from .archive import ARCHIVE_STREAMS, Archive
+from .metrics import WeatherflowMetricsView
+
+from .const import (
+    DOMAIN,
+    DATA_LISTENER,
+    DATA_UNDO_UPDATE_LISTENER,
+    SERVICE_DUMP_DIAGNOSTICS,
+    DIAGNOSTICS_FILE,
+    SERVICE_EXPORT_ARCHIVE,
+    ARCHIVE_DIR,
+    ARCHIVE_EXPORT_FILE,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+CONFIG_SCHEMA = vol.Schema({DOMAIN: vol.Schema({})}, extra=vol.ALLOW_EXTRA)
+
+PLATFORMS = ["sensor"]
+
+ATTR_SERIAL_NUMBER = "serial_number"
+ATTR_TYPE = "type"
+ATTR_START = "start"
+ATTR_END = "end"
+ATTR_STEP = "step"
+
+EXPORT_ARCHIVE_SCHEMA = vol.Schema({
+    vol.Required(ATTR_SERIAL_NUMBER): cv.string,
+    vol.Required(ATTR_TYPE): vol.In(ARCHIVE_STREAMS),
+    vol.Optional(ATTR_START): cv.datetime,
+    vol.Optional(ATTR_END): cv.datetime,
+    vol.Optional(ATTR_STEP): cv.positive_int,
+})
+
+
+async def async_setup(hass: HomeAssistant, config: dict):
+    conf = hass.config_entries.async_entries("weatherflow")
+    if len(conf) == 0:
+        hass.async_create_task(
+                hass.config_entries.flow.async_init(
+                    DOMAIN,
+                    context={"source": SOURCE_IMPORT},
+                    data={},
+                )
+            )
+
+    async def async_dump_diagnostics(call):
+        """Write the ingest diagnostics of every listener to a JSON file."""
+        dump = {
+            entry_id: data[DATA_LISTENER].diagnostics()
+            for entry_id, data in hass.data.get(DOMAIN, {}).items()
+            if DATA_LISTENER in data
+        }
+        path = hass.config.path(DIAGNOSTICS_FILE)
+        await hass.async_add_executor_job(save_json, path, dump)
+        _LOGGER.info("Wrote Weatherflow diagnostics to %s", path)
+
+    hass.services.async_register(DOMAIN, SERVICE_DUMP_DIAGNOSTICS, async_dump_diagnostics)
+
+    hass.http.register_view(WeatherflowMetricsView)
+
+    async def async_export_archive(call):
+        """Write a time range of one device's archive to a JSON file."""
+        sn = call.data[ATTR_SERIAL_NUMBER]
+        type = call.data[ATTR_TYPE]
+        start = call.data.get(ATTR_START)
+        end = call.data.get(ATTR_END)
+
+        archive = Archive(hass.config.path(ARCHIVE_DIR))
+        try:
+            result = await hass.async_add_executor_job(
+                archive.query,
+                sn,
+                type,
+                None if start is None else dt_util.as_timestamp(dt_util.as_utc(start)),
+                None if end is None else dt_util.as_timestamp(dt_util.as_utc(end)),
+                call.data.get(ATTR_STEP),
+            )
+        except (OSError, ValueError) as ex:
+            _LOGGER.error("Unable to read the Weatherflow archive of %s: %s", sn, ex)
+            return
+
+        path = hass.config.path(ARCHIVE_EXPORT_FILE.format(sn, type))
+        await hass.async_add_executor_job(save_json, path, result)
+        _LOGGER.info("Wrote %d Weatherflow %s records to %s", len(result["records"]), type, path)
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_EXPORT_ARCHIVE, async_export_archive, schema=EXPORT_ARCHIVE_SCHEMA)
+    return True
+
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
+    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = {
+        DATA_UNDO_UPDATE_LISTENER: entry.add_update_listener(async_update_options),
+    }
+
+    for component in PLATFORMS:
+        hass.async_create_task(
+            hass.config_entries.async_forward_entry_setup(entry, component)
+        )
+
+    return True
+
+
+async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Unload a config entry."""
+    unload_ok = all(
+        await asyncio.gather(
+            *[
+                hass.config_entries.async_forward_entry_unload(entry, component)
+                for component in PLATFORMS
+            ]
+        )
+    )
+
+    if unload_ok:
+        data = hass.data[DOMAIN].pop(entry.entry_id)
+        data[DATA_UNDO_UPDATE_LISTENER]()
+
+        listener = data.get(DATA_LISTENER)
+        if listener is not None:
+            if listener.unsub_stop is not None:
+                listener.unsub_stop()
+            listener.async_stop()
+
+    return unload_ok
+
+
+async def async_update_options(hass: HomeAssistant, entry: ConfigEntry):
+    """Reload the config entry so the listener picks up new options."""
+    await hass.config_entries.async_reload(entry.entry_id)
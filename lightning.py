@@ -0,0 +1,131 @@
+"""Aggregation of Weatherflow lightning strike events."""
+from collections import deque
+
+# Store fields filled from a closed window by StrikeWindow.summary(), in order
+SUMMARY_FIELDS = (
+    "strike_count", "strike_nearest", "strike_mean_distance", "strike_energy",
+    "strike_first", "strike_last",
+)
+
+# Store fields filled by StormTracker.estimate(), in order
+STORM_FIELDS = ("storm_distance", "storm_speed", "storm_eta", "storm_rate")
+
+# Seconds of strikes the storm track is fitted over
+STORM_WINDOW = 1800
+
+# Strikes needed before the track is fitted
+STORM_MIN_STRIKES = 5
+
+
+class StrikeWindow:
+    """Running totals of the strikes seen since the window opened."""
+
+    __slots__ = ("count", "nearest", "distance", "energy", "first", "last")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.nearest = None
+        self.distance = 0
+        self.energy = 0
+        self.first = None
+        self.last = None
+
+    def add(self, timestamp, distance, energy):
+        self.count += 1
+        if distance is not None:
+            self.distance += distance
+            if self.nearest is None or distance < self.nearest:
+                self.nearest = distance
+        if energy is not None:
+            self.energy += energy
+        if self.first is None:
+            self.first = timestamp
+        self.last = timestamp
+
+    def summary(self):
+        """Return the values of SUMMARY_FIELDS for the strikes of this window."""
+        mean = round(self.distance / self.count, 1) if self.count else None
+        return (self.count, self.nearest, mean, self.energy, self.first, self.last)
+
+
+class StormTracker:
+    """Least-squares fit of strike distance against time over a sliding window.
+
+    Only the sums of the fit are kept, updated as strikes enter and leave the
+    window. Times are stored relative to the first strike of the track to
+    keep the sums small.
+    """
+
+    __slots__ = ("window", "strikes", "origin", "n", "st", "sd", "stt", "std")
+
+    def __init__(self, window=STORM_WINDOW):
+        self.window = window
+        self.strikes = deque()
+        self.reset()
+
+    def reset(self):
+        self.strikes.clear()
+        self.origin = None
+        self.n = 0
+        self.st = self.sd = self.stt = self.std = 0.0
+
+    def add(self, timestamp, distance):
+        if distance is None:
+            return
+        if self.origin is None:
+            self.origin = timestamp
+
+        t = timestamp - self.origin
+        self.strikes.append((t, distance))
+        self.n += 1
+        self.st += t
+        self.sd += distance
+        self.stt += t * t
+        self.std += t * distance
+        self.expire(timestamp)
+
+    def expire(self, timestamp):
+        """Drop the strikes older than the window."""
+        if self.origin is None:
+            return
+
+        oldest = timestamp - self.origin - self.window
+        strikes = self.strikes
+        while strikes and strikes[0][0] <= oldest:
+            t, distance = strikes.popleft()
+            self.n -= 1
+            self.st -= t
+            self.sd -= distance
+            self.stt -= t * t
+            self.std -= t * distance
+
+        if not strikes:
+            self.reset()
+
+    def estimate(self, radius):
+        """Return the values of STORM_FIELDS.
+
+        The fitted distance in km at the latest strike, the approach speed in
+        km/h (negative when receding), the minutes until the storm reaches
+        radius km and the strikes per minute over the window.
+        """
+        n = self.n
+        rate = round(n * 60 / self.window, 2)
+        denominator = n * self.stt - self.st * self.st
+        if n < STORM_MIN_STRIKES or denominator <= 0:
+            return (None, None, None, rate)
+
+        slope = (n * self.std - self.st * self.sd) / denominator
+        intercept = (self.sd - slope * self.st) / n
+        distance = max(0.0, intercept + slope * self.strikes[-1][0])
+
+        if distance <= radius:
+            eta = 0
+        elif slope < 0:
+            eta = round((distance - radius) / -slope / 60)
+        else:
+            eta = None
+        return (round(distance, 1), round(-slope * 3600, 1), eta, rate)
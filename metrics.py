@@ -0,0 +1,95 @@
+"""Prometheus exposition of the Weatherflow stores and ingest counters.
+
+Every numeric store field is a gauge named weatherflow_<field>, labelled with
+the device serial number, its hub and the store it belongs to. Values are
+metric, whatever the Home Assistant unit system.
+"""
+from aiohttp import web
+
+from homeassistant.components.http import HomeAssistantView
+from homeassistant.const import CONTENT_TYPE_TEXT_PLAIN
+
+from .const import DOMAIN, DATA_LISTENER
+
+METRICS_URL = "/api/weatherflow/metrics"
+
+# Ingest counters exposed as weatherflow_ingest_<name>_total
+INGEST_COUNTERS = (
+    "received_frames", "truncated_frames", "invalid_frames", "schema_errors",
+    "failed_frames", "duplicate_frames", "stale_frames", "dropped_frames",
+    "kernel_dropped_frames",
+)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _sample(name, labels, value):
+    if labels:
+        pairs = ",".join('%s="%s"' % (key, _label(label)) for key, label in labels)
+        return "%s{%s} %s" % (name, pairs, value)
+    return "%s %s" % (name, value)
+
+
+class _Families:
+    """Samples grouped by metric family, rendered with one TYPE line per family."""
+
+    def __init__(self):
+        self.families = {}
+
+    def add(self, name, kind, labels, value):
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = (kind, [])
+        family[1].append(_sample(name, labels, value))
+
+    def render(self):
+        lines = []
+        for name, (kind, samples) in self.families.items():
+            lines.append("# TYPE %s %s" % (name, kind))
+            lines.extend(samples)
+        return ("\n".join(lines) + "\n").encode() if lines else b""
+
+
+def render_stores(listener):
+    """Return the exposition text of the stores of one listener."""
+    families = _Families()
+    for sn, controller in listener.controllers.items():
+        hub = controller.hub or sn
+        for store_name, store in controller.stores.items():
+            for field, value in store.data.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    families.add("weatherflow_" + field, "gauge",
+                                 (("sn", sn), ("hub", hub), ("stream", store_name)), value)
+    return families.render()
+
+
+def render_ingest(listener):
+    """Return the exposition text of the ingest counters of one listener."""
+    families = _Families()
+    stats = listener.stats
+    for counter in INGEST_COUNTERS:
+        families.add("weatherflow_ingest_%s_total" % counter, "counter", (), getattr(stats, counter))
+    for hub, count in stats.hub_received.items():
+        families.add("weatherflow_ingest_hub_received_frames_total", "counter", (("hub", hub),), count)
+    for hub, count in stats.hub_dropped.items():
+        families.add("weatherflow_ingest_hub_dropped_frames_total", "counter", (("hub", hub),), count)
+    families.add("weatherflow_ingest_queue_depth", "gauge", (), listener.queue_depth())
+    return families.render()
+
+
+class WeatherflowMetricsView(HomeAssistantView):
+    """Serve the exposition text of every Weatherflow listener."""
+
+    url = METRICS_URL
+    name = "api:weatherflow:metrics"
+
+    async def get(self, request):
+        hass = request.app["hass"]
+        body = b"".join(
+            data[DATA_LISTENER].metrics()
+            for data in hass.data.get(DOMAIN, {}).values()
+            if DATA_LISTENER in data
+        )
+        return web.Response(body=body, content_type=CONTENT_TYPE_TEXT_PLAIN)
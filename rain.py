@@ -0,0 +1,94 @@
+"""Running rain totals of a Weatherflow station."""
+from collections import deque
+
+# Store fields filled by RainAccumulator.totals(), in order
+RAIN_FIELDS = ("rain_last_hour", "rain_today", "rain_yesterday", "rain_event")
+
+# Seconds without rain that end a rain event
+RAIN_EVENT_GAP = 3600
+
+
+class RainAccumulator:
+    """Last hour, today, yesterday and current event totals in mm.
+
+    Each observation adds its rain to every total in constant time. The last
+    hour is a running sum over a deque of the rainy observations in the hour.
+    """
+
+    __slots__ = ("hour", "hour_total", "day", "today", "yesterday", "event", "event_start", "last_rain")
+
+    def __init__(self):
+        self.hour = deque()
+        self.hour_total = 0.0
+        self.day = None
+        self.today = 0.0
+        self.yesterday = 0.0
+        self.event = 0.0
+        self.event_start = None
+        self.last_rain = None
+
+    def start_event(self, timestamp):
+        """Open a rain event when the device reports the start of precipitation."""
+        if self.event_start is None:
+            self.event_start = timestamp
+            self.event = 0.0
+            self.last_rain = timestamp
+
+    def add(self, timestamp, rain, day):
+        """Add the rain of one observation, day being the local date as an ordinal."""
+        if day != self.day:
+            if self.day is not None and day == self.day + 1:
+                self.yesterday = self.today
+            elif self.day is not None:
+                self.yesterday = 0.0
+            self.today = 0.0
+            self.day = day
+
+        hour = self.hour
+        if rain:
+            hour.append((timestamp, rain))
+            self.hour_total += rain
+            self.today += rain
+            if self.event_start is None:
+                self.event_start = timestamp
+                self.event = 0.0
+            self.event += rain
+            self.last_rain = timestamp
+        elif self.event_start is not None and timestamp - self.last_rain >= RAIN_EVENT_GAP:
+            self.event_start = None
+            self.event = 0.0
+
+        while hour and hour[0][0] <= timestamp - 3600:
+            self.hour_total -= hour.popleft()[1]
+        if not hour:
+            self.hour_total = 0.0
+
+    def totals(self):
+        """Return the values of RAIN_FIELDS."""
+        return (
+            round(self.hour_total, 2),
+            round(self.today, 2),
+            round(self.yesterday, 2),
+            round(self.event, 2),
+        )
+
+    def as_dict(self):
+        return {
+            "hour": list(self.hour),
+            "day": self.day,
+            "today": self.today,
+            "yesterday": self.yesterday,
+            "event": self.event,
+            "event_start": self.event_start,
+            "last_rain": self.last_rain,
+        }
+
+    def restore(self, saved):
+        self.hour = deque(tuple(item) for item in saved["hour"])
+        self.hour_total = sum(rain for _, rain in self.hour)
+        self.day = saved["day"]
+        self.today = saved["today"]
+        self.yesterday = saved["yesterday"]
+        self.event = saved["event"]
+        self.event_start = saved["event_start"]
+        self.last_rain = saved["last_rain"]
@@ -0,0 +1,150 @@
+"""Local relay sharing the Weatherflow UDP broadcasts between several consumers.
+
+The relay listens on the hub broadcast port once, decodes each datagram with
+the integration's message schemas and forwards it to every consumer as one
+compact JSON array:
+
+    [type, serial_number, hub_sn, [values in the order of SCHEMAS[type].fields]]
+
+Consumers are unicast UDP addresses or Unix datagram socket paths:
+
+    python -m custom_components.weatherflow.relay --udp 127.0.0.1:50223 --unix /run/weatherflow.sock
+
+Pass --capture to also append the raw datagrams to a capture file readable by
+the benchmark.
+
+The relay only needs the standard library. The Home Assistant integration does
+not read the compact form and still listens on the broadcast port itself, so a
+relay on the same host must share the port with it.
+"""
+import argparse
+import json
+import socket
+import time
+
+from .capture import encode_record
+from .const import UDP_PORT, MAX_DATAGRAM_SIZE
+from .schema import SCHEMAS
+
+
+def encode_message(data):
+    """Return the compact form of a decoded message, or None if its type is unknown."""
+    schema = SCHEMAS.get(data.get("type"))
+    if schema is None:
+        return None
+    values = schema.unpack(data)
+    return json.dumps(
+        [schema.type, data.get("serial_number"), data.get("hub_sn"), list(values)],
+        separators=(",", ":"),
+    ).encode()
+
+
+def decode_message(msg):
+    """Return (type, serial_number, hub_sn, {field: value}) of a relayed message."""
+    type, sn, hub, values = json.loads(msg)
+    return type, sn, hub, dict(zip(SCHEMAS[type].fields, values))
+
+
+def parse_udp(value):
+    host, _, port = value.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class Relay:
+    """Decodes broadcasts once and sends the compact form to every consumer."""
+
+    def __init__(self, udp=(), unix=(), capture=None, port=UDP_PORT):
+        self.port = port
+        self.consumers = []
+        if udp:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.consumers += [(sock, address) for address in udp]
+        if unix:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.consumers += [(sock, path) for path in unix]
+        self.capture = capture
+
+        self.received = 0
+        self.relayed = 0
+        self.invalid = 0
+        self.unknown = 0
+        self.send_errors = 0
+
+    def listen(self):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.settimeout(1)
+        s.bind(("", self.port))
+        return s
+
+    def handle(self, msg, addr=None):
+        """Relay one raw datagram."""
+        self.received += 1
+        if self.capture is not None:
+            self.capture.write(encode_record(time.time(), addr, msg) + "\n")
+
+        try:
+            compact = encode_message(json.loads(msg))
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+            self.invalid += 1
+            return
+        if compact is None:
+            self.unknown += 1
+            return
+
+        for sock, address in self.consumers:
+            try:
+                sock.sendto(compact, address)
+            except OSError:
+                # A consumer that is not running must not stop the others
+                self.send_errors += 1
+        self.relayed += 1
+
+    def run(self, duration=None):
+        s = self.listen()
+        end = None if duration is None else time.time() + duration
+        try:
+            while end is None or time.time() < end:
+                try:
+                    msg, addr = s.recvfrom(MAX_DATAGRAM_SIZE + 1)
+                except socket.timeout:
+                    continue
+                if len(msg) > MAX_DATAGRAM_SIZE:
+                    self.invalid += 1
+                    continue
+                self.handle(msg, addr)
+                if self.capture is not None:
+                    self.capture.flush()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            s.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--udp", type=parse_udp, action="append", default=[],
+                        help="host:port of a UDP consumer, may be repeated")
+    parser.add_argument("--unix", action="append", default=[],
+                        help="path of a Unix datagram socket consumer, may be repeated")
+    parser.add_argument("--capture", help="append the raw datagrams to this capture file")
+    parser.add_argument("--duration", type=float, help="seconds to relay, default until interrupted")
+    parser.add_argument("--port", type=int, default=UDP_PORT)
+
+    args = parser.parse_args(argv)
+
+    capture = open(args.capture, "a") if args.capture else None
+    relay = Relay(args.udp, args.unix, capture, args.port)
+    try:
+        relay.run(args.duration)
+    finally:
+        if capture is not None:
+            capture.close()
+
+    print("Relayed %d of %d datagrams, %d invalid, %d of unknown type, %d send errors" % (
+        relay.relayed, relay.received, relay.invalid, relay.unknown, relay.send_errors))
+
+
+if __name__ == "__main__":
+    main()
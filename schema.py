@@ -0,0 +1,143 @@
+"""Message layouts of the Weatherflow UDP broadcast protocol."""
+import re
+from math import isfinite
+from collections import namedtuple
+from operator import itemgetter
+
+MessageSchema = namedtuple(
+    "MessageSchema",
+    ["type", "store", "device", "discover", "event", "droppable", "strict", "fields", "indexes", "unpack"],
+)
+
+# Parts of the key of a raw datagram, read without decoding the JSON and
+# searched separately so the order of the fields does not matter. Events are
+# keyed by their whole evt array, as a device may report several in a second.
+FRAME_SERIAL = re.compile(rb'"serial_number":\s*"([^"]*)"')
+FRAME_TYPE = re.compile(rb'"type":\s*"([^"]*)"')
+FRAME_STAMP = re.compile(rb'"evt":\s*(\[[^\]]*\])|"obs?":\s*\[\[?\s*(\d+)|"timestamp":\s*(\d+)')
+
+# Device kind for each serial number prefix, used before falling back to the
+# kind of the first message seen from a device
+SERIAL_PREFIXES = {
+    "HB": "hub",
+    "SK": "sky",
+    "AR": "air",
+    "ST": "tempest",
+}
+
+
+def _row_reader(source, indexes):
+    """Build a function returning the values at indexes of a message's data row."""
+    if len(indexes) == 1:
+        index = indexes[0]
+        getter = lambda row: (row[index],)
+    else:
+        getter = itemgetter(*indexes)
+
+    if source == "obs":
+        return lambda data: getter(data["obs"][0])
+    if source is None:
+        return getter
+    return lambda data: getter(data[source])
+
+
+def _schema(type, source, store, device, layout, discover=True, event=None, droppable=False):
+    fields = tuple(field for field, _ in layout)
+    indexes = tuple(index for _, index in layout)
+    # Events may share the timestamp of the last one, other messages must be newer
+    strict = source != "evt"
+    return MessageSchema(
+        type, store, device, discover, event, droppable, strict, fields, indexes,
+        _row_reader(source, indexes))
+
+
+# Every message type understood by the integration. The first field of each
+# layout is the timestamp used to discard repeated and out of order messages.
+# Droppable messages are discarded first when the ingest queue is full.
+SCHEMAS = {schema.type: schema for schema in (
+    _schema("evt_precip", "evt", "precip", "sky", (
+        ("timestamp", 0),
+    ), event="precip_start"),
+    _schema("evt_strike", "evt", "lightning", "air", (
+        ("timestamp", 0),
+        ("distance", 1),
+        ("energy", 2),
+    ), event="lightning_strike"),
+    _schema("rapid_wind", "ob", "rapid_wind", "sky", (
+        ("timestamp", 0),
+        ("rapid_speed", 1),
+        ("rapid_direction", 2),
+    ), droppable=True),
+    _schema("obs_air", "obs", "obs_air", "air", (
+        ("timestamp", 0),
+        ("pressure", 1),
+        ("temp", 2),
+        ("humidity", 3),
+        ("lightning_count", 4),
+        ("lightning_avg_dist", 5),
+        ("battery", 6),
+        ("report_interval", 7),
+    )),
+    _schema("obs_sky", "obs", "obs_sky", "sky", (
+        ("timestamp", 0),
+        ("illuminance", 1),
+        ("uv", 2),
+        ("rain_accum", 3),
+        ("wind_lull", 4),
+        ("wind_avg", 5),
+        ("wind_gust", 6),
+        ("wind_direction", 7),
+        ("battery", 8),
+        ("report_interval", 9),
+        ("solar_radiation", 10),
+        ("precip_type", 12),
+    )),
+    _schema("obs_st", "obs", "obs_st", "tempest", (
+        ("timestamp", 0),
+        ("wind_lull", 1),
+        ("wind_avg", 2),
+        ("wind_gust", 3),
+        ("wind_direction", 4),
+        ("pressure", 6),
+        ("temp", 7),
+        ("humidity", 8),
+        ("illuminance", 9),
+        ("uv", 10),
+        ("solar_radiation", 11),
+        ("rain_accum", 12),
+        ("precip_type", 13),
+        ("lightning_avg_dist", 14),
+        ("lightning_count", 15),
+        ("battery", 16),
+        ("report_interval", 17),
+    )),
+    _schema("device_status", None, "device_status", None, (
+        ("timestamp", "timestamp"),
+        ("rssi", "rssi"),
+    ), discover=False, droppable=True),
+    _schema("hub_status", None, "hub_status", "hub", (
+        ("timestamp", "timestamp"),
+        ("rssi", "rssi"),
+        ("uptime", "uptime"),
+    ), droppable=True),
+)}
+
+
+def valid_timestamp(value):
+    """Return whether a message timestamp is a finite number."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and isfinite(value)
+
+
+def device_kind(serial_number, schema):
+    """Return the kind of device that sent a message."""
+    return SERIAL_PREFIXES.get(serial_number[:2], schema.device)
+
+
+def frame_key(msg):
+    """Return (serial_number, type, timestamp or evt array) of a raw datagram, or None if not found."""
+    serial = FRAME_SERIAL.search(msg)
+    type = FRAME_TYPE.search(msg)
+    stamp = FRAME_STAMP.search(msg)
+    if serial is None or type is None or stamp is None:
+        return None
+    return (serial.group(1), type.group(1), stamp.group(stamp.lastindex))
@@ -1,45 +1,195 @@
 import logging
-from .const import DOMAIN
+from . import get_device_option
+from .schema import SCHEMAS, device_kind, frame_key, valid_timestamp
+from .diagnostics import IngestStats
+from .history import HISTORY_COLUMNS, RingBuffer
+from .derived import DERIVED_FIELDS, derive
+from .archive import Archive
+from .metrics import render_ingest, render_stores
+from .wind import VectorWind, average_fields
+from .rain import RAIN_FIELDS, RainAccumulator
+from .lightning import SUMMARY_FIELDS, STORM_FIELDS, StormTracker, StrikeWindow
+from .descriptions import (
+    WINDOW_FIELDS,
+    RAPID_WIND_SENSORS,
+    SKY_SENSORS,
+    AIR_SENSORS,
+    BATTERY_SENSORS,
+    STRIKE_SENSORS,
+    STATUS_SENSORS,
+    DERIVED_SENSORS,
+    STORM_SENSORS,
+    STRIKE_SUMMARY_SENSORS,
+    RAIN_TOTAL_SENSORS,
+    ROLLING_STATISTICS,
+    wind_average_sensors,
+)
+from .const import (
+    DOMAIN,
+    DATA_LISTENER,
+    STORAGE_KEY,
+    STORAGE_VERSION,
+    UDP_PORT,
+    CONF_RECEIVE_BUFFER,
+    DEFAULT_RECEIVE_BUFFER,
+    MAX_DATAGRAM_SIZE,
+    MAX_BATCH_SIZE,
+    DRAIN_BATCH_SIZE,
+    SO_RXQ_OVFL,
+    DUPLICATE_CACHE_SIZE,
+    CONF_QUEUE_SIZE,
+    DEFAULT_QUEUE_SIZE,
+    CONF_DROP_POLICY,
+    DEFAULT_DROP_POLICY,
+    DROP_POLICY_NEWEST,
+    CONF_RAPID_WIND_INTERVAL,
+    DEFAULT_RAPID_WIND_INTERVAL,
+    CONF_ALWAYS_UPDATE,
+    DEFAULT_ALWAYS_UPDATE,
+    CONF_HISTORY_SENSORS,
+    DEFAULT_HISTORY_SENSORS,
+    CONF_ARCHIVE,
+    DEFAULT_ARCHIVE,
+    ARCHIVE_DIR,
+    CONF_LIGHTNING_WINDOW,
+    DEFAULT_LIGHTNING_WINDOW,
+    CONF_STRIKE_EVENTS,
+    DEFAULT_STRIKE_EVENTS,
+    CONF_STORM_RADIUS,
+    DEFAULT_STORM_RADIUS,
+    CONF_WIND_AVERAGES,
+    DEFAULT_WIND_AVERAGES,
+    CONF_WIND_AVERAGE_INTERVAL,
+    DEFAULT_WIND_AVERAGE_INTERVAL,
+    CONF_ELEVATION,
+    CONF_HEARTBEAT,
+    DEFAULT_HEARTBEAT,
+    DEFAULT_DEADBANDS,
+)
 
-import threading
 import socket
-import time
 import json
-from datetime import datetime
+import struct
+import sys
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from types import MappingProxyType
 import homeassistant.helpers.device_registry as dr
-from homeassistant.core import HomeAssistant
+import homeassistant.util.dt as dt_util
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import storage
 from homeassistant.helpers.entity import Entity
-from homeassistant.const import EVENT_HOMEASSISTANT_STOP, SPEED_MS, CONF_UNIT_SYSTEM_IMPERIAL, ILLUMINANCE, DEVICE_CLASS_ILLUMINANCE, UNIT_UV_INDEX, PRESSURE_MBAR, DEVICE_CLASS_PRESSURE, TEMP_CELSIUS, DEVICE_CLASS_TEMPERATURE, DEVICE_CLASS_HUMIDITY, DEVICE_CLASS_SIGNAL_STRENGTH, PRESSURE_INHG
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP, EVENT_CORE_CONFIG_UPDATE, SPEED_MS, CONF_UNIT_SYSTEM_IMPERIAL
 
 
 _LOGGER = logging.getLogger(__name__)
 
+DIAGNOSTICS_INTERVAL = timedelta(minutes=1)
+EVENT_LIGHTNING_STRIKES = "lightning_strikes"
+EVENT_STORM_RADIUS = "lightning_storm_radius"
+ARCHIVE_INTERVAL = timedelta(minutes=1)
+STORAGE_INTERVAL = timedelta(minutes=5)
+# Seconds to wait after a discovery before saving the known devices
+STORAGE_DELAY = 10
+# Fields of the strike window and storm track, whose state is lost on restart
+UNSAVED_FIELDS = frozenset(SUMMARY_FIELDS + STORM_FIELDS)
+
 async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entities):
     listener = WFListener(hass, config_entry, async_add_entities)
-    listener.start()
-    
-    async def async_stop_listener(_event):
-        listener.stopped.set()
+    await listener.async_restore()
+    await listener.async_start()
+    hass.data[DOMAIN][config_entry.entry_id][DATA_LISTENER] = listener
+
+    @callback
+    def async_stop_listener(_event):
+        listener.async_stop(stopping=True)
 
-    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_stop_listener)
+    listener.unsub_stop = hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_stop_listener)
+    listener.unsub_units = hass.bus.async_listen(EVENT_CORE_CONFIG_UPDATE, listener.async_update_units)
+
+    async_add_entities([IngestDiagnostics(listener)])
 
 class WFSensor(Entity):
-    def __init__(self, field, name, store, controller, hass):
-        self._field = field
-        self._name = name
+    """A sensor of one store field, behaving as its SensorDescription says."""
+    __slots__ = ("description", "_store", "controller", "_deadband", "_written", "_written_at",
+                 "_unit", "_factor", "_digits")
+
+    def __init__(self, description, store, controller):
+        self.description = description
         self._store = store
         self.controller = controller
-        self.hass: HomeAssistant = hass
+        self.hass: HomeAssistant = controller.hass
+
+        self._deadband = controller.deadbands.get(description.deadband, 0)
+        self._written = None
+        self._written_at = None
+
+        self.update_units()
+
+    def update_units(self):
+        """Resolve the unit and converter for the configured unit system."""
+        self._unit = None
+        self._factor = None
+        self._digits = None
+
+        if self.description.units is None:
+            return
+
+        metric, imperial, factor, digits = self.description.units
+        if self.hass.config.units.name == CONF_UNIT_SYSTEM_IMPERIAL:
+            self._unit = imperial
+            self._factor = factor
+            self._digits = digits
+        else:
+            self._unit = metric
+
+    def convert(self, value):
+        if value is None or self._factor is None:
+            return value
+        return round(value * self._factor, self._digits)
 
     async def async_added_to_hass(self):
-        self._store.entities.append(self)
+        self._store.bind(self)
         self.push_update()
 
-    def get_state(self):
-        return self._store.data[self._field]
+    @property
+    def fields(self):
+        """Store fields whose changes require a state write."""
+        return self.description.fields
 
-    def push_update(self):
-        self.async_schedule_update_ha_state()
+    def get_state(self):
+        value = self.description.value
+        if value is not None:
+            return value(self._store.data)
+        return self._store.data[self.description.field]
+
+    def silent_for(self, timestamp):
+        """Seconds of observation time since the last state write."""
+        if self._written_at is None or timestamp is None:
+            return float("inf")
+        return timestamp - self._written_at
+
+    def significant(self, value, timestamp):
+        if not self._deadband or value is None or self._written is None:
+            return True
+        if self.silent_for(timestamp) >= self.controller.heartbeat > 0:
+            return True
+
+        limit = self._deadband
+        if self.description.deadband_relative:
+            limit = abs(self._written) * self._deadband / 100
+        return abs(value - self._written) >= limit
+
+    def push_update(self, timestamp=None):
+        value = self.get_state()
+        if timestamp is not None and not self.significant(value, timestamp):
+            return
+
+        self._written = value
+        self._written_at = self._store.data.get('timestamp')
+        self.async_write_ha_state()
 
     @property
     def should_poll(self):
@@ -51,22 +201,14 @@ class WFSensor(Entity):
 
     @property
     def unique_id(self):
-        return self.controller.sn + "_" + self._field
-        
+        return self.controller.sn + "_" + self.description.key
+
     @property
     def device_state_attributes(self):
-        attr = {}
-
-        if "timestamp" in self._store.data and not self._store.data["timestamp"] is None:
-            attr["Report Time"] = datetime.fromtimestamp(self._store.data["timestamp"])
-
-        if "energy" in self._store.data:
-            attr["Energy"] = self._store.data["energy"]
-
-        if "report_interval" in self._store.data:
-            attr["Report Interval"] = self._store.data["report_interval"]
-
-        return attr
+        attributes = self.description.attributes
+        if attributes is None:
+            return self._store.attributes
+        return attributes(self.get_state(), self._store.data, self.convert, self._store.attributes)
 
     @property
     def device_info(self):
@@ -83,268 +225,483 @@ class WFSensor(Entity):
 
     @property
     def name(self):
-        return self._name
-
-    @property
-    def state(self):
-        return self.get_state()
+        return self.description.name
 
-class WindSensor(WFSensor):
-    
     @property
     def unit_of_measurement(self):
-        if self.hass.config.units.name == CONF_UNIT_SYSTEM_IMPERIAL:
-            return "mph"
-
-        return "m/s"
-
-    @property
-    def icon(self):
-        return 'mdi:weather-windy'
-
-    @property
-    def state(self):
-        if self.get_state() is None:
+        # A state label has no unit, its value is converted in the attributes
+        if self.description.state is not None:
             return None
-        if self.hass.config.units.name == CONF_UNIT_SYSTEM_IMPERIAL:
-            return round(self.get_state() * 2.23694, 2)
-        return self.get_state()
-
-class WindDirection(WFSensor):
+        return self._unit
 
     @property
-    def icon(self):
-        return 'mdi:compass'
+    def device_class(self):
+        return self.description.device_class
 
     @property
-    def device_state_attributes(self):
-        attr = {}
-
-        if "timestamp" in self._store.data and not self._store.data["timestamp"] is None:
-            attr["Report Time"] = datetime.fromtimestamp(self._store.data["timestamp"])
-
-        if "energy" in self._store.data:
-            attr["Energy"] = self._store.data["energy"]
-
-        if "report_interval" in self._store.data:
-            attr["Report Interval"] = self._store.data["report_interval"]
-
-        attr['Direction'] = self.get_state()
-        return attr
+    def icon(self):
+        icon = self.description.icon
+        if callable(icon):
+            return icon(self.get_state())
+        return icon
 
     @property
     def state(self):
-        state = self.get_state()
-        if state is None:
+        state = self.description.state
+        if state is not None:
+            return state(self.get_state())
+        return self.convert(self.get_state())
+
+class RollingSensor(WFSensor):
+    """A statistic over a window of a device's observation history."""
+    __slots__ = ("_history", "_column", "_seconds", "_statistic")
+
+    def __init__(self, description, store, controller, history, column, seconds, statistic):
+        super().__init__(description, store, controller)
+        self._history = history
+        self._column = column
+        self._seconds = seconds
+        self._statistic = statistic
+
+    def get_state(self):
+        value = self._history.statistic(self._column, self._seconds, self._statistic)
+        if value is None:
             return None
+        return round(value, 3)
 
-        val=int((state/22.5)+.5)
-        arr=["N","NNE","NE","ENE","E","ESE", "SE", "SSE","S","SSW","SW","WSW","W","WNW","NW","NNW"]
-        return arr[(val % 16)]
+class IngestDiagnostics(Entity):
+    """Ingest counters of a listener, written every DIAGNOSTICS_INTERVAL."""
+    def __init__(self, listener):
+        self.listener = listener
+        self._unsub_refresh = None
 
-class IlluminanceSensor(WFSensor):
-    @property
-    def unit_of_measurement(self):
-        return ILLUMINANCE
+    async def async_added_to_hass(self):
+        self._unsub_refresh = async_track_time_interval(
+            self.hass, self._async_refresh, DIAGNOSTICS_INTERVAL)
 
-    @property
-    def device_class(self):
-        return DEVICE_CLASS_ILLUMINANCE
+    async def async_will_remove_from_hass(self):
+        if self._unsub_refresh is not None:
+            self._unsub_refresh()
+            self._unsub_refresh = None
+
+    @callback
+    def _async_refresh(self, _now):
+        self.async_write_ha_state()
 
-class UV(WFSensor):
     @property
-    def unit_of_measurement(self):
-        return UNIT_UV_INDEX
+    def should_poll(self):
+        return False
 
     @property
-    def icon(self):
-        return 'mdi:weather-sunny'
+    def unique_id(self):
+        return self.listener.config_entry.entry_id + "_ingest"
 
-class SolarRadiation(WFSensor):
     @property
-    def unit_of_measurement(self):
-        return "w/m2"
+    def name(self):
+        return "Weatherflow Ingest"
 
     @property
     def icon(self):
-        return 'mdi:weather-sunny'
+        return "mdi:lan-connect"
 
-class Rain(WFSensor):
     @property
     def unit_of_measurement(self):
-        if self.hass.config.units.name == CONF_UNIT_SYSTEM_IMPERIAL:
-            return 'in'
-        return 'mm'
+        return "frames"
 
     @property
     def state(self):
-        if self.get_state() is None:
-            return None
-        if self.hass.config.units.name == CONF_UNIT_SYSTEM_IMPERIAL:
-            return round(self.get_state() / 25.4, 3)
-        return self.get_state()
-
-    @property
-    def icon(self):
-        return 'mdi:water'
-
-class RainRate(WFSensor):
-
-    @property
-    def rain_rate(self):
-        if self._store.data['rain_accum'] is None or self._store.data['report_interval'] is None:
-            return None
-        return self._store.data['rain_accum'] / self._store.data['report_interval'] * 60
+        return self.listener.stats.received_frames
 
     @property
     def device_state_attributes(self):
-        attr = {}
-
-        if "timestamp" in self._store.data and not self._store.data["timestamp"] is None:
-            attr["Report Time"] = datetime.fromtimestamp(self._store.data["timestamp"])
-
-        if "energy" in self._store.data:
-            attr["Energy"] = self._store.data["energy"]
-
-        if "report_interval" in self._store.data:
-            attr["Report Interval"] = self._store.data["report_interval"]
-
-        if not self.rain_rate is None:
-            if self.hass.config.units.name == CONF_UNIT_SYSTEM_IMPERIAL:
-                attr['Rain Rate'] = round(self.rain_rate / 25.4, 3)
-            else:
-                attr['Rain Rate'] = self.rain_rate
-        return attr
-
-    @property
-    def state(self):
-        rain_rate = self.rain_rate
-        if rain_rate is None:
-            return None
-        if rain_rate == 0:
-            return "None"
-        if rain_rate > 0 and rain_rate < 0.25:
-            return "Very Light"
-        if rain_rate >= 0.25 and rain_rate < 1.0:
-            return "Light"
-        if rain_rate >= 1.0 and rain_rate < 4.0:
-            return "Moderate"
-        if rain_rate >= 4.0 and rain_rate < 16.0:
-            return "Heavy"
-        if rain_rate >= 16.0 and rain_rate < 50.0:
-            return "Very Heavy"
-        if rain_rate >= 50.0:
-            return "Extreme"
+        return self.listener.diagnostics()
 
-    @property
-    def icon(self):
-        if self.rain_rate is None or self.rain_rate == 0:
-            return "mdi:water-off"
-        if self.rain_rate >= 4:
-            return "mdi:weather-pouring"
-
-        return "mdi:weather-rainy"
-    
-class Battery(WFSensor):
-    @property
-    def unit_of_measurement(self):
-        return 'V'
-        
-    @property
-    def icon(self):
-        return 'mdi:battery'
+class Store:
+    """Latest values of one message stream and the entities reading them."""
+    __slots__ = ("data", "entities", "bindings", "dirty", "snapshot")
 
-class Pressure(WFSensor):
-    @property
-    def unit_of_measurement(self):
-        if self.hass.config.units.name == CONF_UNIT_SYSTEM_IMPERIAL:
-            return PRESSURE_INHG
-        return PRESSURE_MBAR
+    def __init__(self, init={}):
+        self.data = init
+        self.entities = []
+        self.bindings = {}
+        self.dirty = set()
+        self.snapshot = None
 
     @property
-    def device_class(self):
-        return DEVICE_CLASS_PRESSURE
+    def attributes(self):
+        """Read-only attributes shared by every entity of the current observation."""
+        if self.snapshot is None:
+            data = self.data
+            attr = {}
+
+            if data.get("timestamp") is not None:
+                attr["Report Time"] = datetime.fromtimestamp(data["timestamp"])
+
+            if "energy" in data:
+                attr["Energy"] = data["energy"]
+
+            if "report_interval" in data:
+                attr["Report Interval"] = data["report_interval"]
+
+            self.snapshot = MappingProxyType(attr)
+        return self.snapshot
+
+    def bind(self, entity):
+        self.entities.append(entity)
+        for field in entity.fields:
+            self.bindings.setdefault(field, []).append(entity)
+
+    def update(self, fields, values):
+        data = self.data
+        for field, value in zip(fields, values):
+            if data.get(field) != value:
+                data[field] = value
+                self.dirty.add(field)
+                self.snapshot = None
+
+    def flush(self, always=False, heartbeat=0):
+        """Write the state of entities bound to fields changed since the last flush.
+
+        Entities silent for at least heartbeat seconds are written as well.
+        """
+        timestamp = self.data.get('timestamp')
+
+        if always:
+            woken = self.entities
+        else:
+            woken = []
+            for field in self.dirty:
+                for entity in self.bindings.get(field, ()):
+                    if entity not in woken:
+                        woken.append(entity)
+            if heartbeat:
+                for entity in self.entities:
+                    if entity not in woken and entity.silent_for(timestamp) >= heartbeat:
+                        woken.append(entity)
+        self.dirty.clear()
+
+        for entity in woken:
+            entity.push_update(timestamp)
+
+class SampleWindow:
+    """Running min/max/mean of the samples seen since the last reset."""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        if value is None:
+            return
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
 
     @property
-    def state(self):
-        if self.get_state() is None:
+    def mean(self):
+        if self.count == 0:
             return None
-        if self.hass.config.units.name == CONF_UNIT_SYSTEM_IMPERIAL:
-            return round(self.get_state() / 33.863753, 3)
-        return self.get_state()
-
-class Temperature(WFSensor):
-    @property
-    def unit_of_measurement(self):
-        return TEMP_CELSIUS
+        return self.total / self.count
+
+class Device:
+    """A Weatherflow device whose stores are laid out by its message schemas."""
+    NAME = "Weatherflow Device"
+    # Device kind as returned by device_kind, saved with the known devices
+    KIND = None
+    STREAMS = ()
+    # Stream whose observations the derived quantities are computed from
+    DERIVED_STREAM = None
+    # Stream whose rain_accum feeds the rain totals
+    RAIN_STREAM = None
+    # Sensors of the device as (store, descriptions)
+    SENSORS = ()
 
-    @property
-    def device_class(self):
-        return DEVICE_CLASS_TEMPERATURE
+    def __init__(self, sn, hub, hass, config_entry, async_add_entities):
+        self.sn = sn
+        self.hub = hub
+        self.hass = hass
+        self.config_entry = config_entry
+        self.async_add_entities = async_add_entities
 
-class Humidity(WFSensor):
-    @property
-    def unit_of_measurement(self):
-        return '%'
+        self.history_sensors = get_device_option(
+            config_entry.options, sn, CONF_HISTORY_SENSORS, DEFAULT_HISTORY_SENSORS)
+
+        # Observation history is only kept for the rolling statistic sensors
+        self.stores = {}
+        self.history = {}
+        for type in self.STREAMS:
+            schema = SCHEMAS[type]
+            self.stores[schema.store] = Store(dict.fromkeys(schema.fields))
+            if self.history_sensors and type in HISTORY_COLUMNS:
+                self.history[type] = RingBuffer(HISTORY_COLUMNS[type])
+
+        if self.DERIVED_STREAM is not None:
+            self.stores[self.DERIVED_STREAM].data.update(dict.fromkeys(DERIVED_FIELDS))
+
+        self.rain = None
+        if self.RAIN_STREAM is not None:
+            self.rain = RainAccumulator()
+            self.stores[self.RAIN_STREAM].data.update(dict.fromkeys(RAIN_FIELDS))
+
+        # Lightning strikes are summarised per window, with per-strike events opt-in
+        self.strikes = None
+        self._unsub_strikes = None
+        self.lightning_window = get_device_option(
+            config_entry.options, sn, CONF_LIGHTNING_WINDOW, DEFAULT_LIGHTNING_WINDOW)
+        if "evt_strike" in self.STREAMS and self.lightning_window:
+            self.strikes = StrikeWindow()
+            self.stores["lightning"].data.update(dict.fromkeys(SUMMARY_FIELDS))
+
+        # The storm track follows every strike, fitted whatever the window option
+        self.storm = None
+        self.storm_inside = False
+        self.storm_radius = get_device_option(
+            config_entry.options, sn, CONF_STORM_RADIUS, DEFAULT_STORM_RADIUS)
+        if "evt_strike" in self.STREAMS:
+            self.storm = StormTracker()
+            self.stores["lightning"].data.update(dict.fromkeys(STORM_FIELDS))
+
+        self.events = {type for type in self.STREAMS if SCHEMAS[type].event is not None}
+        if not get_device_option(config_entry.options, sn, CONF_STRIKE_EVENTS, DEFAULT_STRIKE_EVENTS):
+            self.events.discard("evt_strike")
+        self.elevation = get_device_option(
+            config_entry.options, sn, CONF_ELEVATION, hass.config.elevation)
+
+        # Every controller of the listener, used to find other devices on the same hub
+        self.peers = {}
+        self.archive = None
+        # The listener, whose metrics cache is cleared by updates outside parseData
+        self.listener = None
+
+        self.always_update = get_device_option(
+            config_entry.options, sn, CONF_ALWAYS_UPDATE, DEFAULT_ALWAYS_UPDATE)
+        self.heartbeat = get_device_option(
+            config_entry.options, sn, CONF_HEARTBEAT, DEFAULT_HEARTBEAT)
+        self.deadbands = {
+            key: get_device_option(config_entry.options, sn, key, default)
+            for key, default in DEFAULT_DEADBANDS.items()
+        }
 
-    @property
-    def device_class(self):
-        return DEVICE_CLASS_HUMIDITY
+        self.hasObs = False
+        self._hubname = self.NAME + " " + self.sn
 
-class LightningCount(WFSensor):
-    @property
-    def icon(self):
-        return "mdi:flash"
+    async def setupHub (self):
+        pass
 
-class LightningDistance(WFSensor):
-    @property
-    def icon(self):
-        return "mdi:flash"
+    def add_entities(self):
+        """Add the entities of this device, once."""
+        if self.hasObs:
+            return
+        entities = self.entities()
+        if self.history_sensors:
+            entities += self.rolling_entities()
+        self.async_add_entities(entities)
+        self.hasObs = True
+
+    def saved(self):
+        """Return what is kept of this device across restarts."""
+        saved = {
+            "kind": self.KIND,
+            "hub_sn": self.hub,
+            "stores": {
+                name: {key: value for key, value in store.data.items() if key not in UNSAVED_FIELDS}
+                for name, store in self.stores.items()
+            },
+        }
+        if self.rain is not None:
+            saved["rain"] = self.rain.as_dict()
+        return saved
+
+    def restore(self, saved):
+        """Load the saved data of each store and the rain totals."""
+        for name, data in saved["stores"].items():
+            store = self.stores.get(name)
+            timestamp = data.get('timestamp')
+            # Files saved before timestamps were checked may hold invalid ones
+            if store is not None and (timestamp is None or valid_timestamp(timestamp)):
+                store.data.update(
+                    (key, value) for key, value in data.items()
+                    if key in store.data and key not in UNSAVED_FIELDS)
+        if self.rain is not None and "rain" in saved:
+            self.rain.restore(saved["rain"])
+
+    def sensors(self):
+        """Return the (store, descriptions) of every sensor of this device."""
+        sensors = list(self.SENSORS)
+        if self.DERIVED_STREAM is not None:
+            sensors.append((self.DERIVED_STREAM, DERIVED_SENSORS))
+        if self.storm is not None:
+            sensors.append(("lightning", STORM_SENSORS))
+        if self.strikes is not None:
+            sensors.append(("lightning", STRIKE_SUMMARY_SENSORS))
+        if self.RAIN_STREAM is not None:
+            sensors.append((self.RAIN_STREAM, RAIN_TOTAL_SENSORS))
+        return sensors
+
+    def entities(self):
+        return [
+            WFSensor(description, self.stores[store], self)
+            for store, descriptions in self.sensors()
+            for description in descriptions
+        ]
+
+    def wind_speed(self):
+        """Latest average wind speed at this device, for derived quantities."""
+        return None
+
+    def rolling_entities(self):
+        entities = []
+        for type, history in self.history.items():
+            store = self.stores[SCHEMAS[type].store]
+            for description, column, seconds, statistic in ROLLING_STATISTICS.get(type, ()):
+                entities.append(RollingSensor(description, store, self, history, column, seconds, statistic))
+        return entities
+
+    def handles(self, schema):
+        return schema.store in self.stores
+
+    def should_push(self, schema, store):
+        return True
 
-    @property
-    def unit_of_measurement(self):
-        if self.hass.config.units.name == CONF_UNIT_SYSTEM_IMPERIAL:
-            return 'mi'
-        return 'km'
+    @callback
+    def parseData(self, data):
+        """Update the stores from a message, returning False if it is older than the last one.
 
-    @property
-    def state(self):
-        if self.get_state() is None:
-            return None
-        if self.hass.config.units.name == CONF_UNIT_SYSTEM_IMPERIAL:
-            return round(self.get_state() / 1.609, 3)
-        return self.get_state()
+        Messages other than events must also be newer than the last one.
+        """
+        schema = SCHEMAS[data["type"]]
+        store = self.stores[schema.store]
 
-class PrecipType(WFSensor):
-    @property
-    def state(self):
-        if self.get_state() is None:
-            return None
-        if self.get_state() == 1:
-            return 'Rain'
-        if self.get_state() == 2:
-            return 'Hail'
-        return 'None'
+        values = schema.unpack(data)
+        timestamp = values[0]
+        if not valid_timestamp(timestamp):
+            raise ValueError("invalid timestamp %r" % (timestamp,))
 
-    @property
-    def icon(self):
-        if self.get_state() == 1:
-            return 'mdi:weather-rainy'
-        if self.get_state() == 2:
-            return 'mdi:weather-hail'
-        return 'mdi:water-off'
+        if not self.hasObs:
+            self.add_entities()
+
+        last = store.data['timestamp']
+        if last is not None and (timestamp < last or (schema.strict and timestamp == last)):
+            return False
+
+        store.update(schema.fields, values)
+        if self.archive is not None:
+            self.archive.append(self.sn, schema, values)
+
+        history = self.history.get(schema.type)
+        if history is not None:
+            history.append(values[0], store.data)
+
+        if schema.type == self.DERIVED_STREAM:
+            data = store.data
+            store.update(DERIVED_FIELDS, derive(
+                data['temp'], data['humidity'], data['pressure'], self.wind_speed(), self.elevation))
+
+        if schema.type == self.RAIN_STREAM:
+            day = dt_util.as_local(dt_util.utc_from_timestamp(values[0])).toordinal()
+            self.rain.add(values[0], store.data['rain_accum'], day)
+            store.update(RAIN_FIELDS, self.rain.totals())
+        elif schema.type == "evt_precip" and self.rain is not None:
+            self.rain.start_event(values[0])
+
+        if self.strikes is not None and schema.type == "evt_strike":
+            data = store.data
+            self.strikes.add(values[0], data['distance'], data['energy'])
+            if self._unsub_strikes is None:
+                self._unsub_strikes = async_call_later(
+                    self.hass, self.lightning_window, self._async_close_strikes)
+
+        if self.storm is not None:
+            if schema.type == "evt_strike":
+                self.storm.add(values[0], store.data['distance'])
+                self.update_storm()
+            elif schema.type == self.DERIVED_STREAM and self.storm.n:
+                # Observations age strikes out of the track between strikes
+                self.storm.expire(values[0])
+                self.update_storm()
+                self.stores["lightning"].flush()
+
+        if schema.type in self.events:
+            event = {'sn': self.sn, 'hubsn': self.hub}
+            event.update(zip(schema.fields, values))
+            event['timestamp'] = datetime.fromtimestamp(values[0])
+            self.hass.bus.async_fire(schema.event, event)
+
+        if self.should_push(schema, store):
+            store.flush(self.always_update, self.heartbeat)
+        return True
 
-class RSSI(WFSensor):
-    @property
-    def device_class(self):
-        return DEVICE_CLASS_SIGNAL_STRENGTH
+    def update_storm(self):
+        """Refit the storm track, firing an event when it crosses the radius."""
+        estimate = self.storm.estimate(self.storm_radius)
+        self.stores["lightning"].update(STORM_FIELDS, estimate)
+
+        distance = estimate[0]
+        inside = distance is not None and distance <= self.storm_radius
+        if inside == self.storm_inside:
+            return
+        self.storm_inside = inside
+
+        event = dict(zip(STORM_FIELDS, estimate))
+        event['sn'] = self.sn
+        event['hubsn'] = self.hub
+        event['inside'] = inside
+        event['radius'] = self.storm_radius
+        self.hass.bus.async_fire(EVENT_STORM_RADIUS, event)
+
+    @callback
+    def _async_close_strikes(self, _now):
+        """Publish the strikes of the window that just ended.
+
+        A window with strikes opens the next one, so the summary falls back to
+        zero one window after the last strike.
+        """
+        strikes = self.strikes
+        store = self.stores["lightning"]
+        summary = strikes.summary()
+        strikes.reset()
+
+        store.update(SUMMARY_FIELDS, summary)
+        store.flush(self.always_update)
+        if self.listener is not None:
+            self.listener.metrics_text = None
+
+        self._unsub_strikes = None
+        if not summary[0]:
+            return
+
+        event = dict(zip(SUMMARY_FIELDS, summary))
+        event['sn'] = self.sn
+        event['hubsn'] = self.hub
+        event['strike_first'] = datetime.fromtimestamp(summary[4])
+        event['strike_last'] = datetime.fromtimestamp(summary[5])
+        self.hass.bus.async_fire(EVENT_LIGHTNING_STRIKES, event)
+
+        self._unsub_strikes = async_call_later(
+            self.hass, self.lightning_window, self._async_close_strikes)
+
+    @callback
+    def async_stop(self):
+        if self._unsub_strikes is not None:
+            self._unsub_strikes()
+            self._unsub_strikes = None
+
+class Hub(Device):
+    NAME = "Weatherflow Hub"
+    KIND = "hub"
+    STREAMS = ("hub_status",)
 
-class Hub:
     def __init__(self, sn, hass, config_entry):
-        self.sn = sn
-        self.hass = hass
-        self.config_entry = config_entry
-        self._hubname = "Weatherflow Hub " + self.sn
+        super().__init__(sn, None, hass, config_entry, None)
+        self.hasObs = True
+
     async def setupHub (self):
         device_registry = await dr.async_get_registry(self.hass)
 
@@ -359,276 +716,473 @@ class Hub:
             sw_version="",
         )
 
-class Store:
-    def __init__(self, init={}):
-        self.entities = []
-        self.data = init
+class RapidWindDevice(Device):
+    """A device reporting rapid_wind, whose state writes can be rate limited."""
 
-class Sky:
     def __init__(self, sn, hub, hass, config_entry, async_add_entities):
-        self.sn = sn
-        self.hub = hub
+        super().__init__(sn, hub, hass, config_entry, async_add_entities)
+
+        self.rapid_wind_interval = get_device_option(
+            config_entry.options, sn, CONF_RAPID_WIND_INTERVAL, DEFAULT_RAPID_WIND_INTERVAL)
+        self.rapid_wind_window = SampleWindow()
+        self.rapid_wind_written = None
+
+        # Vector averages of rapid_wind, by window in minutes, empty windows skipped
+        windows = get_device_option(
+            config_entry.options, sn, CONF_WIND_AVERAGES, DEFAULT_WIND_AVERAGES)
+        minutes = {int(window) for window in str(windows).split(",") if window.strip()}
+        self.wind_averages = {
+            window: VectorWind(window * 60) for window in sorted(minutes) if window > 0
+        }
+        self.wind_average_interval = get_device_option(
+            config_entry.options, sn, CONF_WIND_AVERAGE_INTERVAL, DEFAULT_WIND_AVERAGE_INTERVAL)
+        self.wind_average_written = None
+        for minutes in self.wind_averages:
+            self.stores['rapid_wind'].data.update(dict.fromkeys(average_fields(minutes)))
+
+    def sensors(self):
+        sensors = super().sensors()
+        for minutes in self.wind_averages:
+            sensors.append(("rapid_wind", wind_average_sensors(minutes)))
+        return sensors
+
+    def update_wind_averages(self, store):
+        """Add a rapid_wind sample to every window, publishing at the configured cadence."""
+        data = store.data
+        timestamp = data['timestamp']
+        for average in self.wind_averages.values():
+            average.add(timestamp, data['rapid_speed'], data['rapid_direction'])
+
+        if (self.wind_average_written is not None
+                and timestamp - self.wind_average_written < self.wind_average_interval):
+            return
+        self.wind_average_written = timestamp
+        for minutes, average in self.wind_averages.items():
+            store.update(average_fields(minutes), average.averages())
+
+    def should_push(self, schema, store):
+        if schema.type != "rapid_wind":
+            return True
+
+        if self.wind_averages:
+            self.update_wind_averages(store)
+
+        window = self.rapid_wind_window
+        window.add(store.data['rapid_speed'])
+
+        timestamp = store.data['timestamp']
+        if (self.rapid_wind_written is not None
+                and timestamp - self.rapid_wind_written < self.rapid_wind_interval):
+            return False
+
+        self.rapid_wind_written = timestamp
+        if self.rapid_wind_interval:
+            store.update(WINDOW_FIELDS, (window.min, window.max, window.mean, window.count))
+        window.reset()
+        return True
+
+class Sky(RapidWindDevice):
+    NAME = "Weatherflow Sky"
+    KIND = "sky"
+    STREAMS = ("rapid_wind", "obs_sky", "evt_precip", "device_status")
+    RAIN_STREAM = "obs_sky"
+    SENSORS = (
+        ("rapid_wind", RAPID_WIND_SENSORS),
+        ("obs_sky", SKY_SENSORS + BATTERY_SENSORS),
+        ("device_status", STATUS_SENSORS),
+    )
+
+class Air(Device):
+    NAME = "Weatherflow Air"
+    KIND = "air"
+    STREAMS = ("obs_air", "evt_strike", "device_status")
+    DERIVED_STREAM = "obs_air"
+    SENSORS = (
+        ("obs_air", AIR_SENSORS + BATTERY_SENSORS),
+        ("lightning", STRIKE_SENSORS),
+        ("device_status", STATUS_SENSORS),
+    )
+
+    def wind_speed(self):
+        for controller in self.peers.values():
+            if isinstance(controller, Sky) and controller.hub == self.hub:
+                return controller.stores['obs_sky'].data['wind_avg']
+        return None
+
+class Tempest(RapidWindDevice):
+    NAME = "Weatherflow Tempest"
+    KIND = "tempest"
+    STREAMS = ("rapid_wind", "obs_st", "evt_precip", "evt_strike", "device_status")
+    DERIVED_STREAM = "obs_st"
+    RAIN_STREAM = "obs_st"
+    SENSORS = (
+        ("rapid_wind", RAPID_WIND_SENSORS),
+        ("obs_st", SKY_SENSORS + AIR_SENSORS + BATTERY_SENSORS),
+        ("lightning", STRIKE_SENSORS),
+        ("device_status", STATUS_SENSORS),
+    )
+
+    def wind_speed(self):
+        return self.stores['obs_st'].data['wind_avg']
+
+DEVICE_CLASSES = {
+    "sky": Sky,
+    "air": Air,
+    "tempest": Tempest,
+}
+
+
+class WFListener:
+    def __init__(self, hass, config_entry, async_add_entities):
         self.hass = hass
         self.config_entry = config_entry
-        self.async_add_entities = async_add_entities
-
-        self.rapid_wind = Store({'timestamp': None, 'rapid_speed': None, 'rapid_direction': None})
-        self.obs_sky = Store({
-            'timestamp': None, 
-            'illuminance': None, 
-            'uv': None, 
-            'rain_accum': None, 
-            'wind_lull': None, 
-            'wind_avg': None, 
-            'wind_gust': None, 
-            'wind_direction': None, 
-            'report_interval': None, 
-            'battery': None,
-            'solar_radiation': None, 
-            'precip_type': None
-            })
-
-        self.device_status = Store({
-            'timestamp': None,
-            'rssi': None
-        })
 
-        self.hasObs = False
-        self._hubname = "Weatherflow Sky " + self.sn
-
-    async def setupHub (self):
-        pass
-
-    async def parseData(self, data):
-        if not self.hasObs:
-            self.async_add_entities([
-                WindSensor("rapid_speed", "Wind Current Speed", self.rapid_wind, self, self.hass),
-                WindDirection("rapid_direction", "Wind Current Direction", self.rapid_wind, self, self.hass),
-                IlluminanceSensor("illuminance", "Illuminance", self.obs_sky, self, self.hass),
-                UV("uv", "UV Index", self.obs_sky, self, self.hass),
-                Rain("rain_accum", "Accumulated Rain", self.obs_sky, self, self.hass),
-                RainRate("", "Rain Rate", self.obs_sky, self, self.hass),
-                WindSensor("wind_lull", "Wind Lull", self.obs_sky, self, self.hass),
-                WindSensor("wind_avg", "Wind Average", self.obs_sky, self, self.hass),
-                WindSensor("wind_gust", "Wind Gust", self.obs_sky, self, self.hass),
-                WindDirection("wind_direction", "Wind Direction", self.obs_sky, self, self.hass),
-                Battery("battery", "Battery Voltage", self.obs_sky, self, self.hass),
-                SolarRadiation("solar_radiation", "Solar Radiation", self.obs_sky, self, self.hass),
-                PrecipType("precip_type", "Precipitation Type", self.obs_sky, self, self.hass),
-                RSSI("rssi", "RSSI", self.device_status, self, self.hass),
-            ])
-            self.hasObs = True
-
-        if data["type"] == "device_status":
-            
-            if self.device_status.data['timestamp'] != data['timestamp']:
-                self.device_status.data['timestamp'] = data['timestamp']
-                self.device_status.data['rssi'     ] = data['rssi']
-
-                for sensor in self.device_status.entities:
-                    sensor.push_update()
-
-        if data["type"] == "rapid_wind":
-
-            if self.rapid_wind.data['timestamp'] != data['ob'][0]:
-                self.rapid_wind.data['timestamp'      ] = data['ob'][0]
-                self.rapid_wind.data['rapid_speed'    ] = data['ob'][1]
-                self.rapid_wind.data['rapid_direction'] = data['ob'][2]
-
-                for sensor in self.rapid_wind.entities:
-                    sensor.push_update()
-
-        if data["type"] == "obs_sky":
-
-            if self.obs_sky.data['timestamp'] != data['obs'][0][0]:
-
-                self.obs_sky.data['timestamp'        ] = data['obs'][0][0]
-                self.obs_sky.data['illuminance'      ] = data['obs'][0][1]
-                self.obs_sky.data['uv'               ] = data['obs'][0][2]
-                self.obs_sky.data['rain_accum'       ] = data['obs'][0][3]
-                self.obs_sky.data['wind_lull'        ] = data['obs'][0][4]
-                self.obs_sky.data['wind_avg'         ] = data['obs'][0][5]
-                self.obs_sky.data['wind_gust'        ] = data['obs'][0][6]
-                self.obs_sky.data['wind_direction'   ] = data['obs'][0][7]
-                self.obs_sky.data['battery'          ] = data['obs'][0][8]
-                self.obs_sky.data['report_interval'  ] = data['obs'][0][9]
-                self.obs_sky.data['solar_radiation'  ] = data['obs'][0][10]
-                self.obs_sky.data['precip_type'      ] = data['obs'][0][12]
-
-                for sensor in self.obs_sky.entities:
-                    sensor.push_update()
-
-class Air:
+        self.controllers = {}
 
-    def __init__(self, sn, hub, hass, config_entry, async_add_entities):
-        self.sn = sn
-        self.hub = hub
-        self.hass = hass
-        self.config_entry = config_entry
         self.async_add_entities = async_add_entities
+        self.sock = None
+        # Ancillary data read with each datagram, room for the kernel drop count on Linux
+        self.ancbufsize = 0
+        self.unsub_stop = None
+        self.unsub_units = None
+        self.unsub_archive = None
+        self.unsub_storage = None
+        # Whether a delayed save is waiting, the Store writes it itself when Home Assistant stops
+        self.save_pending = False
+
+        self.storage = storage.Store(
+            hass, STORAGE_VERSION, STORAGE_KEY.format(config_entry.entry_id))
+
+        self.stats = IngestStats()
+        # Unit system the entity converters were resolved for
+        self.units = hass.config.units.name
+
+        options = config_entry.options
+        self.queue_size = options.get(CONF_QUEUE_SIZE, DEFAULT_QUEUE_SIZE)
+        self.drop_policy = options.get(CONF_DROP_POLICY, DEFAULT_DROP_POLICY)
+        # Observations and events are queued apart from droppable messages so
+        # the oldest droppable message can be found in constant time
+        self.queue = deque()
+        self.droppable_queue = deque()
+        self.draining = False
+
+        # Keys of recent frames in least recently seen order
+        self.seen = OrderedDict()
+
+        # Exposition text of the stores, rebuilt on the first scrape after an
+        # update. The ingest counters change with every frame and are never cached.
+        self.metrics_text = None
+
+        self.archive = None
+        if options.get(CONF_ARCHIVE, DEFAULT_ARCHIVE):
+            self.archive = Archive(hass.config.path(ARCHIVE_DIR))
+
+    def setupHub(self, sn):
+        if not sn in self.controllers:
+            self.controllers[sn] = Hub(sn, self.hass, self.config_entry)
+            self.hass.async_create_task(self.controllers[sn].setupHub())
+            self.async_schedule_save()
+        return self.controllers[sn]
+
+    def setupDevice(self, data, schema):
+        return self.setupController(
+            data['serial_number'], device_kind(data['serial_number'], schema), data.get('hub_sn'))
+
+    def setupController(self, sn, kind, hub):
+        if kind == "hub":
+            return self.setupHub(sn)
+
+        cls = DEVICE_CLASSES.get(kind)
+        if cls is None:
+            return None
 
-        self.obs_air = Store({
-            'timestamp': None, 
-            'pressure': None, 
-            'temp': None, 
-            'humidity': None, 
-            'lightning_count': None, 
-            'lightning_avg_dist': None, 
-            'battery': None, 
-            'report_interval': None})
-
-        self.lightning = Store({
-            'timestamp': None, 
-            'distance': None, 
-            'energy': None})
-
-        self.device_status = Store({
-            'timestamp': None,
-            'rssi': None
-        })
+        self.setupHub(hub)
+        controller = cls(sn, hub, self.hass, self.config_entry, self.async_add_entities)
+        controller.peers = self.controllers
+        controller.archive = self.archive
+        controller.listener = self
+        self.controllers[sn] = controller
+        self.hass.async_create_task(controller.setupHub())
+        self.async_schedule_save()
+        return controller
+
+    async def async_restore(self):
+        """Recreate the devices known from earlier runs with their last observations."""
+        saved = await self.storage.async_load()
+        if not saved:
+            return
+
+        for sn, device in saved.get("devices", {}).items():
+            controller = self.setupController(sn, device["kind"], device["hub_sn"])
+            if controller is None:
+                continue
+            controller.restore(device)
+            controller.add_entities()
 
-        self.hasObs = False
-        self._hubname = "Weatherflow Air " + self.sn
+    def storage_data(self):
+        self.save_pending = False
+        return {"devices": {sn: controller.saved() for sn, controller in self.controllers.items()}}
 
-    async def setupHub (self):
-        pass
+    @callback
+    def async_schedule_save(self, _now=None):
+        self.save_pending = True
+        self.storage.async_delay_save(self.storage_data, STORAGE_DELAY)
 
-    async def parseData(self, data):
-        if not self.hasObs:
-            self.async_add_entities([
-                Pressure("pressure", "Station Pressure", self.obs_air, self, self.hass),
-                Temperature("temp", "Temperature", self.obs_air, self, self.hass),
-                Humidity("humidity", "Relative Humidity", self.obs_air, self, self.hass),
-                LightningCount("lightning_count", "Lightning Strike Count", self.obs_air, self, self.hass),
-                LightningDistance("lightning_avg_dist", "Lightning Average Distance", self.obs_air, self, self.hass),
-                Battery("battery", "Battery Voltage", self.obs_air, self, self.hass),
-                LightningDistance("distance", "Lightning Strike", self.lightning, self, self.hass),
-                RSSI("rssi", "RSSI", self.device_status, self, self.hass),
-            ])
-            self.hasObs = True
-
-        if data["type"] == "device_status":
-            if self.device_status.data['timestamp'] != data['timestamp']:
-                self.device_status.data['timestamp'] = data['timestamp']
-                self.device_status.data['rssi'] = data['rssi']
-
-                for sensor in self.device_status.entities:
-                    sensor.push_update()
-
-        if data["type"] == "obs_air":
-
-            if self.obs_air.data['timestamp'] != data['obs'][0][0]:
-                self.obs_air.data['timestamp'         ] = data['obs'][0][0]
-                self.obs_air.data['pressure'          ] = data['obs'][0][1]
-                self.obs_air.data['temp'              ] = data['obs'][0][2]
-                self.obs_air.data['humidity'          ] = data['obs'][0][3]
-                self.obs_air.data['lightning_count'   ] = data['obs'][0][4]
-                self.obs_air.data['lightning_avg_dist'] = data['obs'][0][5]
-                self.obs_air.data['battery'           ] = data['obs'][0][6]
-                self.obs_air.data['report_interval'   ] = data['obs'][0][7]
-
-                for sensor in self.obs_air.entities:
-                    sensor.push_update()
-
-        if data["type"] == "evt_strike":
-
-            if self.lightning.data['timestamp'] != data['evt'][0]:
-                self.lightning.data['timestamp'         ] = data['evt'][0]
-                self.lightning.data['distance'          ] = data['evt'][1]
-                self.lightning.data['energy'            ] = data['evt'][2]
-
-                for sensor in self.lightning.entities:
-                    sensor.push_update()
-
-                hass.bus.fire('lightning_strike', {
-                    'sn': self.sn,
-                    'hubsn': self.hubsn,
-                    'timestamp': datetime.fromtimestamp(data['evt'][0]),
-                    'distance': data['evt'][1],
-                    'energy': data['evt'][2]
-                })
-
-
-class WFListener(threading.Thread):
-    def __init__(self, hass, config_entry, async_add_entities):
-        threading.Thread.__init__(self)
-        self.daemon = True
-        self.hass = hass
-        self.config_entry = config_entry
+    @callback
+    def async_prep_payload(self, data, schema, received):
+        try:
+            controller = self.controllers.get(data['serial_number'])
+            if controller is None:
+                if not schema.discover:
+                    return
+                controller = self.setupDevice(data, schema)
+
+            if controller is None or not controller.handles(schema):
+                return
+
+            if controller.parseData(data):
+                self.stats.record_latency(time.monotonic() - received)
+                self.metrics_text = None
+            else:
+                self.stats.stale_frames += 1
+        except (KeyError, IndexError, TypeError, ValueError) as ex:
+            self.stats.schema_errors += 1
+            _LOGGER.debug("Malformed Weatherflow %s message: %s", schema.type, ex)
+        except Exception:
+            self.stats.failed_frames += 1
+            _LOGGER.exception("Error processing Weatherflow %s message", schema.type)
+
+    @callback
+    def async_update_units(self, _event):
+        """Rebuild entity converters after the core unit system changed."""
+        units = self.hass.config.units.name
+        if units == self.units:
+            return
+        self.units = units
+
+        for controller in self.controllers.values():
+            for store in controller.stores.values():
+                for entity in store.entities:
+                    entity.update_units()
+                    entity.async_schedule_update_ha_state()
+
+    def queue_depth(self):
+        return len(self.queue) + len(self.droppable_queue)
+
+    def diagnostics(self):
+        return self.stats.as_dict(self.queue_depth())
+
+    def metrics(self):
+        if self.metrics_text is None:
+            self.metrics_text = render_stores(self)
+        return self.metrics_text + render_ingest(self)
+
+    def devices(self):
+        return [sn for sn, controller in self.controllers.items() if not isinstance(controller, Hub)]
+
+    async def async_start(self):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
-        self.controllers = {}
+        rcvbuf = self.config_entry.options.get(CONF_RECEIVE_BUFFER, DEFAULT_RECEIVE_BUFFER)
+        if rcvbuf:
+            try:
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+            except OSError as ex:
+                _LOGGER.warning("Unable to set Weatherflow receive buffer to %s: %s", rcvbuf, ex)
 
-        self.async_add_entities = async_add_entities
-        self.stopped = threading.Event()
+        if sys.platform.startswith("linux"):
+            try:
+                s.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                self.ancbufsize = socket.CMSG_SPACE(4)
+            except OSError as ex:
+                _LOGGER.debug("Kernel drops of Weatherflow datagrams will not be counted: %s", ex)
 
-    def setupHub(self, data):
-        if not data['hub_sn'] in self.controllers:
-            self.controllers[data['hub_sn']] = Hub(data['hub_sn'], self.hass, self.config_entry)
-            self.hass.async_create_task(self.controllers[data['hub_sn']].setupHub())
+        s.setblocking(False)
+        s.bind(("", UDP_PORT))
 
-    def setupSky(self, data):
-        if not data['serial_number'] in self.controllers:
-            self.controllers[data['serial_number']] = Sky(
-                data['serial_number'], data['hub_sn'], self.hass, self.config_entry, self.async_add_entities)
-            self.hass.async_create_task(self.controllers[data['serial_number']].setupHub())
+        self.sock = s
+        self.hass.loop.add_reader(s.fileno(), self._read_ready)
 
-    def setupAir(self, data):
-        if not data['serial_number'] in self.controllers:
-            self.controllers[data['serial_number']] = Air(
-                data['serial_number'], data['hub_sn'], self.hass, self.config_entry, self.async_add_entities)
-            self.hass.async_create_task(self.controllers[data['serial_number']].setupHub())
+        self.unsub_storage = async_track_time_interval(
+            self.hass, self.async_schedule_save, STORAGE_INTERVAL)
 
+        if self.archive is not None:
+            self.unsub_archive = async_track_time_interval(
+                self.hass, self.async_flush_archive, ARCHIVE_INTERVAL)
 
-    async def async_prep_payload(self, data):
+    async def async_flush_archive(self, _now=None):
+        """Append the records buffered since the last flush to the archive files."""
+        pending = self.archive.take_pending()
+        if not pending:
+            return
         try:
-            type = data['type']
-            if type == "device_status":
-                if data['serial_number'] in self.controllers:
-                    self.hass.async_create_task(self.controllers[data['serial_number']].parseData(data))
-            if type == "evt_precip":
-                self.setupHub(data)
-                self.setupSky(data)
-                hass.bus.fire('precip_start', {
-                    'sn': data['serial_number'],
-                    'hubsn': data['hub_sn'],
-                    'timestamp': datetime.fromtimestamp(data['evt'][0])
-                })
+            await self.hass.async_add_executor_job(self.archive.write, pending)
+        except OSError as ex:
+            _LOGGER.warning("Unable to write the Weatherflow archive: %s", ex)
+
+    def _recv(self):
+        """Read one datagram, returning None if it did not fit in the read buffer."""
+        if hasattr(self.sock, "recvmsg"):
+            msg, ancdata, flags, _ = self.sock.recvmsg(MAX_DATAGRAM_SIZE + 1, self.ancbufsize)
+            for level, type, data in ancdata:
+                if level == socket.SOL_SOCKET and type == SO_RXQ_OVFL:
+                    # Datagrams dropped since the socket was opened
+                    self.stats.kernel_dropped_frames = struct.unpack("=I", data[:4])[0]
+            if flags & getattr(socket, "MSG_TRUNC", 0):
+                return None
+        else:
+            msg = self.sock.recv(MAX_DATAGRAM_SIZE + 1)
+
+        if len(msg) > MAX_DATAGRAM_SIZE:
+            return None
+        return msg
 
-            if type == "rapid_wind" or type == "obs_sky":
-                self.setupHub(data)
-                self.setupSky(data)
+    def _read_ready(self):
+        """Drain every queued datagram and hand them off as one batch."""
+        msgs = []
 
-                self.hass.async_create_task(self.controllers[data['serial_number']].parseData(data))
+        for _ in range(MAX_BATCH_SIZE):
+            try:
+                msg = self._recv()
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as ex:
+                _LOGGER.debug("Weatherflow listener socket error: %s", ex)
+                break
+
+            if msg is None:
+                self.stats.received_frames += 1
+                self.stats.truncated_frames += 1
+                _LOGGER.debug("Dropped oversized Weatherflow datagram")
+                continue
 
-            if type == "obs_air" or type == "evt_strike":
-                self.setupHub(data)
-                self.setupAir(data)
+            msgs.append(msg)
 
-                self.hass.async_create_task(self.controllers[data['serial_number']].parseData(data))
-        except:
-            pass
+        self.async_ingest(msgs)
 
+    @callback
+    def async_ingest(self, msgs):
+        """Decode raw datagrams and queue them for dispatch."""
+        stats = self.stats
+        seen = self.seen
+        received = time.monotonic()
 
+        for msg in msgs:
+            stats.received_frames += 1
 
-    def run(self):
-        
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.setblocking(False)
-        s.bind(("", 50222))
+            key = frame_key(msg)
+            if key is not None and key in seen:
+                seen.move_to_end(key)
+                stats.duplicate_frames += 1
+                continue
 
-        while not self.stopped.isSet():
             try:
-                msg=s.recvfrom(1024)
-                data=json.loads(msg[0])      # this is the JSON payload
+                data = json.loads(msg)      # this is the JSON payload
+            except ValueError:
+                stats.invalid_frames += 1
+                continue
+
+            if key is not None:
+                seen[key] = None
+                if len(seen) > DUPLICATE_CACHE_SIZE:
+                    seen.popitem(last=False)
 
-                self.hass.async_create_task(self.async_prep_payload(data))
-            except socket.error as ex:
-                time.sleep(0.01)
+            try:
+                type = data['type']
+                hub = data.get('hub_sn', data.get('serial_number'))
+            except (KeyError, TypeError, AttributeError):
+                stats.schema_errors += 1
+                continue
+            if not isinstance(type, str) or not isinstance(hub, str):
+                # Both key the ingest counters and schema lookup, so must be strings
+                stats.schema_errors += 1
                 continue
-                    
-        s.close()
 
-    def stop(self):
-        self._stopped = True        
\ No newline at end of file
+            stats.received_types[type] += 1
+            stats.hub_received[hub] += 1
+
+            schema = SCHEMAS.get(type)
+            if schema is not None:
+                self.enqueue((data, schema, received, hub))
+
+        if not self.draining and (self.queue or self.droppable_queue):
+            self.draining = True
+            self.hass.loop.call_soon(self.async_drain)
+
+    def enqueue(self, item):
+        """Queue a (data, schema, received, hub) item, dropping one if the queue is full."""
+        droppable = item[1].droppable
+
+        if self.queue_depth() >= self.queue_size:
+            # Observations and events always evict a droppable message first,
+            # the policy only chooses between messages of the same class
+            if self.droppable_queue and (not droppable or self.drop_policy != DROP_POLICY_NEWEST):
+                self.drop(self.droppable_queue.popleft())
+            elif droppable or self.drop_policy == DROP_POLICY_NEWEST:
+                self.drop(item)
+                return
+            else:
+                self.drop(self.queue.popleft())
+
+        if droppable:
+            self.droppable_queue.append(item)
+        else:
+            self.queue.append(item)
+
+    def drop(self, item):
+        self.stats.dropped_frames += 1
+        self.stats.hub_dropped[item[3]] += 1
+
+    @callback
+    def async_drain(self):
+        """Dispatch up to DRAIN_BATCH_SIZE queued messages, observations and events first.
+
+        While messages remain the drain runs again on the next loop iteration,
+        so the socket is read in between and the queue fills under load.
+        """
+        try:
+            for _ in range(DRAIN_BATCH_SIZE):
+                if self.queue:
+                    data, schema, received, _ = self.queue.popleft()
+                elif self.droppable_queue:
+                    data, schema, received, _ = self.droppable_queue.popleft()
+                else:
+                    break
+                self.async_prep_payload(data, schema, received)
+        finally:
+            if self.queue or self.droppable_queue:
+                self.hass.loop.call_soon(self.async_drain)
+            else:
+                self.draining = False
+
+    @callback
+    def async_stop(self, stopping=False):
+        """Stop listening and save the known devices.
+
+        When Home Assistant is stopping, a pending delayed save is left to the
+        Store, which writes it on the same stop event.
+        """
+        if self.unsub_units is not None:
+            self.unsub_units()
+            self.unsub_units = None
+
+        for controller in self.controllers.values():
+            controller.async_stop()
+
+        if self.unsub_storage is not None:
+            self.unsub_storage()
+            self.unsub_storage = None
+            if not (stopping and self.save_pending):
+                self.hass.async_create_task(self.storage.async_save(self.storage_data()))
+
+        if self.unsub_archive is not None:
+            self.unsub_archive()
+            self.unsub_archive = None
+            self.hass.async_create_task(self.async_flush_archive())
+
+        if self.sock is not None:
+            self.hass.loop.remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
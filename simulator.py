@@ -0,0 +1,312 @@
+"""Simulated Weatherflow hub traffic for load testing the integration.
+
+Broadcast the traffic of 2 hubs with 3 devices each to the local listener in
+real time, with a thunderstorm over every station:
+
+    python -m custom_components.weatherflow.simulator send --hubs 2 --devices 3 --storm
+
+Replay an hour of simulated traffic through WFListener for a growing number of
+devices and report CPU, memory and state writes per simulated second:
+
+    python -m custom_components.weatherflow.simulator report --devices 1 10 100 --duration 3600
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import math
+import random
+import socket
+import time
+import tracemalloc
+
+from .benchmark import async_replay
+from .const import UDP_PORT
+
+# Seconds between messages of each periodic type
+CADENCES = {
+    "hub_status": 10,
+    "device_status": 60,
+    "rapid_wind": 3,
+    "obs": 60,
+}
+
+# Device kinds assigned in turn to the devices of a hub
+KINDS = ("tempest", "sky", "air")
+
+# Strikes per minute over a station in storm mode
+STORM_STRIKE_RATE = 20
+
+
+def _encode(message):
+    return json.dumps(message, separators=(",", ":")).encode()
+
+
+class SimulatedHub:
+    def __init__(self, number, start):
+        self.sn = "HB-%08d" % number
+        self.start = start
+        self.seq = 0
+
+    def hub_status(self, now):
+        self.seq += 1
+        return {
+            "serial_number": self.sn,
+            "type": "hub_status",
+            "firmware_revision": "171",
+            "uptime": int(now - self.start) + 86400,
+            "rssi": random.randint(-70, -50),
+            "timestamp": int(now),
+            "reset_flags": "BOR,PIN,POR",
+            "seq": self.seq,
+            "radio_stats": [22, 1, 0, 3, 16721],
+        }
+
+
+class SimulatedDevice:
+    """One station whose readings follow slow random walks."""
+
+    PREFIXES = {"tempest": "ST", "sky": "SK", "air": "AR"}
+
+    def __init__(self, number, kind, hub, start, storm=False):
+        self.sn = "%s-%08d" % (self.PREFIXES[kind], number)
+        self.kind = kind
+        self.hub = hub
+        self.start = start
+        self.storm = storm
+
+        self.temp = random.uniform(5, 30)
+        self.humidity = random.uniform(30, 90)
+        self.pressure = random.uniform(990, 1030)
+        self.wind = random.uniform(0, 6)
+        self.direction = random.uniform(0, 360)
+        self.rain = 0.0
+        self.battery = random.uniform(2.6, 3.4)
+        self.storm_distance = random.uniform(25, 40)
+        self.raining = False
+
+    @property
+    def has_wind(self):
+        return self.kind != "air"
+
+    @property
+    def has_lightning(self):
+        return self.kind != "sky"
+
+    def walk(self):
+        gust = 3 if self.storm else 1
+        self.temp += random.gauss(0, 0.05) - (0.05 if self.storm else 0)
+        self.humidity = min(100.0, max(5.0, self.humidity + random.gauss(0, 0.3)))
+        self.pressure += random.gauss(0, 0.05)
+        self.wind = max(0.0, self.wind + random.gauss(0, 0.3 * gust))
+        self.direction = (self.direction + random.gauss(0, 5 * gust)) % 360
+
+    def light(self, now):
+        """Illuminance, UV index and solar radiation for the hour of day."""
+        sun = max(0.0, math.sin((now % 86400) / 86400 * 2 * math.pi - math.pi / 2))
+        if self.storm:
+            sun *= 0.2
+        illuminance = int(sun * 100000)
+        return illuminance, round(sun * 10, 2), int(illuminance / 126.7)
+
+    def rain_minute(self):
+        rain = round(random.uniform(0.1, 1.5), 2) if self.storm else 0.0
+        self.rain += rain
+        return rain, 1 if rain else 0
+
+    def rapid_wind(self, now):
+        self.walk()
+        speed = round(max(0.0, self.wind + random.gauss(0, 0.5)), 2)
+        return {"serial_number": self.sn, "type": "rapid_wind", "hub_sn": self.hub,
+                "ob": [int(now), speed, int(self.direction)]}
+
+    def obs(self, now):
+        self.walk()
+        ts = int(now)
+        lull = round(self.wind * 0.6, 2)
+        avg = round(self.wind, 2)
+        gust = round(self.wind * (2.0 if self.storm else 1.4), 2)
+        direction = int(self.direction)
+        illuminance, uv, solar = self.light(now)
+        strikes = STORM_STRIKE_RATE if self.storm and self.has_lightning else 0
+        strike_distance = int(self.storm_distance) if strikes else 0
+        battery = round(self.battery, 2)
+
+        if self.kind == "air":
+            return {"serial_number": self.sn, "type": "obs_air", "hub_sn": self.hub,
+                    "obs": [[ts, round(self.pressure, 2), round(self.temp, 2), round(self.humidity),
+                             strikes, strike_distance, battery, 1]],
+                    "firmware_revision": 17}
+
+        rain, precip_type = self.rain_minute()
+        if self.kind == "sky":
+            return {"serial_number": self.sn, "type": "obs_sky", "hub_sn": self.hub,
+                    "obs": [[ts, illuminance, uv, rain, lull, avg, gust, direction, battery,
+                             1, solar, None, precip_type, 3]],
+                    "firmware_revision": 29}
+
+        return {"serial_number": self.sn, "type": "obs_st", "hub_sn": self.hub,
+                "obs": [[ts, lull, avg, gust, direction, 3, round(self.pressure, 2),
+                         round(self.temp, 2), round(self.humidity), illuminance, uv, solar,
+                         rain, precip_type, strike_distance, strikes, battery, 1]],
+                "firmware_revision": 134}
+
+    def device_status(self, now):
+        return {"serial_number": self.sn, "type": "device_status", "hub_sn": self.hub,
+                "timestamp": int(now), "uptime": int(now - self.start) + 3600,
+                "voltage": round(self.battery, 2), "firmware_revision": 134,
+                "rssi": random.randint(-80, -60), "hub_rssi": random.randint(-80, -60),
+                "sensor_status": 0, "debug": 0}
+
+    def evt_strike(self, now):
+        # The storm closes in at about 30 km/h until it is overhead
+        self.storm_distance = max(1.0, self.storm_distance - 0.5 / STORM_STRIKE_RATE)
+        distance = max(1, int(random.gauss(self.storm_distance, 2)))
+        return {"serial_number": self.sn, "type": "evt_strike", "hub_sn": self.hub,
+                "evt": [int(now), distance, random.randint(1000, 20000)]}
+
+    def evt_precip(self, now):
+        return {"serial_number": self.sn, "type": "evt_precip", "hub_sn": self.hub,
+                "evt": [int(now)]}
+
+
+def build(hubs, devices, start, storm=False):
+    """Create hubs and their devices, numbering serials from 1."""
+    stations = []
+    number = 1
+    for h in range(hubs):
+        hub = SimulatedHub(h + 1, start)
+        members = []
+        for d in range(devices):
+            members.append(SimulatedDevice(number, KINDS[d % len(KINDS)], hub.sn, start, storm))
+            number += 1
+        stations.append((hub, members))
+    return stations
+
+
+def generate(hubs, devices, duration, storm=False, start=None):
+    """Yield (time, datagram) for every message of the simulated stations in time order."""
+    if start is None:
+        start = time.time()
+    end = start + duration
+
+    schedule = []
+    seq = 0
+
+    def every(first, interval, emit):
+        nonlocal seq
+        heapq.heappush(schedule, (first, seq, interval, emit))
+        seq += 1
+
+    for hub, members in build(hubs, devices, start, storm):
+        every(start + random.uniform(0, CADENCES["hub_status"]), CADENCES["hub_status"], hub.hub_status)
+        for device in members:
+            offset = random.uniform(0, 3)
+            every(start + offset + 1, CADENCES["obs"], device.obs)
+            every(start + offset + 2, CADENCES["device_status"], device.device_status)
+            if device.has_wind:
+                every(start + offset, CADENCES["rapid_wind"], device.rapid_wind)
+            if storm and device.has_wind:
+                every(start + offset + 0.5, None, device.evt_precip)
+            if storm and device.has_lightning:
+                every(start + random.expovariate(STORM_STRIKE_RATE / 60), "strike", device.evt_strike)
+
+    while schedule:
+        now, _, interval, emit = heapq.heappop(schedule)
+        if now >= end:
+            break
+        yield now, _encode(emit(now))
+
+        if interval == "strike":
+            heapq.heappush(schedule, (now + random.expovariate(STORM_STRIKE_RATE / 60), seq, interval, emit))
+        elif interval is not None:
+            heapq.heappush(schedule, (now + interval, seq, interval, emit))
+        seq += 1
+
+
+def send(hubs, devices, duration, storm=False, host="127.0.0.1", port=UDP_PORT):
+    """Send simulated traffic to host in real time."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+
+    count = 0
+    start = time.time()
+    try:
+        for when, msg in generate(hubs, devices, duration, storm, start):
+            delay = when - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            s.sendto(msg, (host, port))
+            count += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        s.close()
+    return count
+
+
+def report(levels, hubs=1, duration=3600, storm=False):
+    """Replay simulated traffic for each device count, one result per level."""
+    results = []
+    for devices in levels:
+        per_hub = max(1, math.ceil(devices / hubs))
+        frames = list(generate(min(hubs, devices), per_hub, duration, storm))
+
+        cpu = time.process_time()
+        replay = asyncio.run(async_replay(frames, speed=0))
+        cpu = time.process_time() - cpu
+
+        # A second pass measures memory, tracing would distort the CPU time
+        tracemalloc.start()
+        asyncio.run(async_replay(frames, speed=0))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results.append({
+            "devices": min(hubs, devices) * per_hub,
+            "frames": replay["frames"],
+            "frames_per_second": round(replay["frames"] / duration, 2),
+            "cpu_percent": round(cpu / duration * 100, 3),
+            "cpu_us_per_frame": round(cpu / replay["frames"] * 1e6, 1) if replay["frames"] else None,
+            "peak_memory_kb": round(peak / 1024),
+            "state_writes_per_second": round(replay["state_writes"] / duration, 2),
+            "failed_frames": replay["failed_frames"] + replay["schema_errors"],
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    snd = commands.add_parser("send", help="send simulated traffic over UDP in real time")
+    snd.add_argument("--hubs", type=int, default=1)
+    snd.add_argument("--devices", type=int, default=3, help="devices per hub")
+    snd.add_argument("--duration", type=float, default=3600, help="seconds to send")
+    snd.add_argument("--storm", action="store_true", help="thunderstorm over every station")
+    snd.add_argument("--host", default="127.0.0.1")
+    snd.add_argument("--port", type=int, default=UDP_PORT)
+
+    rep = commands.add_parser("report", help="replay simulated traffic through the listener")
+    rep.add_argument("--devices", type=int, nargs="+", default=[1, 10, 100], help="device counts to report")
+    rep.add_argument("--hubs", type=int, default=1, help="hubs the devices are spread over")
+    rep.add_argument("--duration", type=float, default=3600, help="simulated seconds per device count")
+    rep.add_argument("--storm", action="store_true", help="thunderstorm over every station")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "send":
+        count = send(args.hubs, args.devices, args.duration, args.storm, args.host, args.port)
+        print("Sent %d datagrams" % count)
+        return
+
+    results = report(args.devices, args.hubs, args.duration, args.storm)
+    columns = list(results[0])
+    print(" ".join("%24s" % column for column in columns))
+    for result in results:
+        print(" ".join("%24s" % result[column] for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Running vector averages of Weatherflow wind samples."""
+from collections import deque
+from math import atan2, cos, degrees, radians, sin
+
+
+def average_fields(minutes):
+    """Store fields of the mean speed and direction over a window of minutes."""
+    return ("wind_speed_%dm" % minutes, "wind_direction_%dm" % minutes)
+
+
+class VectorWind:
+    """Mean speed and vector mean direction of the samples of the last window.
+
+    Direction is averaged from the sums of the u and v wind components, so it
+    stays correct across north. Samples leaving the window are subtracted from
+    the sums, making each update constant time.
+    """
+
+    __slots__ = ("window", "samples", "u", "v", "speed")
+
+    def __init__(self, seconds):
+        self.window = seconds
+        self.samples = deque()
+        self.u = self.v = self.speed = 0.0
+
+    def add(self, timestamp, speed, direction):
+        if speed is None or direction is None:
+            return
+
+        angle = radians(direction)
+        u = speed * sin(angle)
+        v = speed * cos(angle)
+        self.samples.append((timestamp, u, v, speed))
+        self.u += u
+        self.v += v
+        self.speed += speed
+
+        samples = self.samples
+        while samples and samples[0][0] <= timestamp - self.window:
+            _, u, v, speed = samples.popleft()
+            self.u -= u
+            self.v -= v
+            self.speed -= speed
+
+    def averages(self):
+        """Return the mean speed and direction in degrees, direction None when calm."""
+        n = len(self.samples)
+        if not n:
+            return (None, None)
+
+        speed = round(max(0.0, self.speed / n), 2)
+        if not speed:
+            return (speed, None)
+        return (speed, round(degrees(atan2(self.u, self.v))) % 360)